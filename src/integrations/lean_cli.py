@@ -0,0 +1,207 @@
+# Shared helpers for running the LEAN CLI from async code.
+# Used by both the local LeanBridge and the QuantConnectCloudBridge.
+import asyncio
+import functools
+import importlib
+import logging
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Sequence
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 65536
+
+# Default cap on concurrently running LEAN CLI commands per bridge
+DEFAULT_IO_CONCURRENCY = 8
+
+# Commands that change CLI configuration/credentials or scaffold files always
+# run as one-shot `lean` processes, never inside a shared worker.
+_ONE_SHOT_COMMANDS = frozenset({"login", "logout", "init", "config", "whoami"})
+
+# "module:attribute" of the click group pool workers run
+LEAN_CLI = "lean.commands:lean"
+
+# Written by `lean login`/`logout`. The CLI reads it once at import (into its
+# API client), so workers are replaced whenever it changes; see get_worker_pool.
+_CREDENTIALS_PATH = os.path.join(os.path.expanduser("~"), ".lean", "credentials")
+
+# Set in each pool worker by _init_worker
+_lean_cli = None
+_temp_manager = None
+
+
+def _credentials_mtime() -> int | None:
+    try:
+        return os.stat(_CREDENTIALS_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _init_worker(cli: str):
+    """Imports the CLI once per worker process (this is the slow part of a cold `lean`)."""
+    global _lean_cli, _temp_manager
+    module_name, _, attribute = cli.partition(":")
+    _lean_cli = getattr(importlib.import_module(module_name), attribute)
+    if cli == LEAN_CLI:
+        from lean.container import container
+        _temp_manager = container.temp_manager
+
+
+def _run_in_worker(argv: list[str]) -> tuple[int, str, str]:
+    """Invokes the already-imported LEAN CLI in-process and captures its output."""
+    from click.testing import CliRunner
+    try:
+        runner = CliRunner(mix_stderr=False)  # click < 8.2
+    except TypeError:
+        runner = CliRunner()  # click >= 8.2 always captures stderr separately
+    try:
+        result = runner.invoke(_lean_cli, argv)
+    finally:
+        # What the `lean` entry point (lean.main.main) does after every command;
+        # without it a long-lived worker accumulates temporary directories
+        if _temp_manager is not None and _temp_manager.delete_temporary_directories_when_done:
+            _temp_manager.delete_temporary_directories()
+    return result.exit_code, result.stdout, result.stderr
+
+
+class LeanWorkerPool:
+    """
+    Keeps N worker processes with the LEAN CLI already imported and runs
+    commands inside them, so a command no longer pays interpreter startup plus
+    the CLI's heavy imports. The executor hands each command to the next idle
+    worker; a worker runs one command at a time.
+
+    `cli` is the "module:attribute" of the click group to run (tests pass a
+    stub). `credentials_mtime` records the LEAN credentials the workers were
+    started with.
+    """
+
+    def __init__(self, max_workers: int | None = None, cli: str = LEAN_CLI):
+        self.max_workers = max_workers or os.cpu_count()
+        self.credentials_mtime = _credentials_mtime()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            # spawn rather than fork: the server process has running threads
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(cli,),
+        )
+
+    def can_run(self, argv: Sequence[str]) -> bool:
+        return bool(argv) and argv[0] not in _ONE_SHOT_COMMANDS
+
+    async def run(self, argv: Sequence[str]) -> tuple[int, str, str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _run_in_worker, list(argv))
+
+    def shutdown(self, cancel_pending: bool = True):
+        """Stops the workers; with cancel_pending=False queued commands still run first."""
+        self._executor.shutdown(wait=False, cancel_futures=cancel_pending)
+
+
+_worker_pool: LeanWorkerPool | None = None
+_worker_pool_disabled = False
+
+
+def get_worker_pool() -> LeanWorkerPool | None:
+    """
+    Returns the process-wide worker pool, created on first use, or None when
+    pooling is off. Set LEAN_WORKERS to a worker count, or "auto" for one per
+    CPU, to enable it; unset or 0 keeps one `lean` process per command. Any
+    other value logs a warning once and also leaves pooling off.
+
+    If the LEAN credentials file changed since the pool started (e.g. a
+    one-shot `lean login`), the pool is replaced, so commands run in workers
+    that read the new credentials; commands already queued on the old pool
+    finish there.
+    """
+    global _worker_pool, _worker_pool_disabled
+    if _worker_pool is not None and _worker_pool.credentials_mtime != _credentials_mtime():
+        logger.info("LEAN credentials changed; restarting the LEAN worker pool")
+        _worker_pool.shutdown(cancel_pending=False)
+        _worker_pool = LeanWorkerPool(_worker_pool.max_workers)
+    if _worker_pool is None and not _worker_pool_disabled:
+        setting = os.getenv("LEAN_WORKERS", "0").strip().lower()
+        try:
+            workers = os.cpu_count() if setting == "auto" else int(setting or 0)
+            if workers < 0:
+                raise ValueError(setting)
+        except ValueError:
+            logger.warning("Ignoring invalid LEAN_WORKERS=%r (expected a worker count or 'auto'); "
+                           "running one `lean` process per command", setting)
+            workers = 0
+        if workers:
+            _worker_pool = LeanWorkerPool(workers)
+        else:
+            _worker_pool_disabled = True
+    return _worker_pool
+
+
+async def _read_pipe(loop: asyncio.AbstractEventLoop, pipe) -> str:
+    """
+    Reads a child process pipe to EOF without blocking the event loop.
+
+    Output is pulled in READ_CHUNK_SIZE chunks and appended in place to a
+    single bytearray, so a multi-MB backtest log costs no per-chunk list or
+    final join. It is decoded once as UTF-8 at EOF.
+    """
+    reader = asyncio.StreamReader(limit=READ_CHUNK_SIZE)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    buf = bytearray()
+    while True:
+        data = await reader.read(READ_CHUNK_SIZE)
+        if not data:
+            break
+        buf += data
+    return buf.decode("utf-8", errors="replace")
+
+
+async def run_lean(argv: Sequence[str], executable: str = "lean") -> tuple[int, str, str]:
+    """
+    Runs `lean <argv>` and returns (return_code, stdout, stderr) with the
+    output decoded as UTF-8 (invalid bytes replaced).
+
+    asyncio's own subprocess support calls Popen on the event loop thread, and
+    Popen blocks until the child has exec'd (it reads the CLOEXEC error pipe).
+    With a large `lean` install under IO contention that can stall every other
+    request for seconds, so the fork/exec runs on a worker thread here and only
+    the output pipes are read on the loop.
+
+    If a LEAN_WORKERS pool is enabled, commands it can serve run in a warm
+    worker instead; if the pool breaks (e.g. the CLI can't be imported), it is
+    disabled and commands fall back to separate processes.
+
+    Raises FileNotFoundError if the executable cannot be found.
+    """
+    global _worker_pool, _worker_pool_disabled
+    pool = get_worker_pool()
+    if pool is not None and pool.can_run(argv):
+        try:
+            return await pool.run(argv)
+        except BrokenProcessPool:
+            logger.exception("LEAN worker pool failed; falling back to one process per command")
+            pool.shutdown()
+            _worker_pool, _worker_pool_disabled = None, True
+
+    loop = asyncio.get_running_loop()
+    process = await loop.run_in_executor(
+        None,
+        functools.partial(
+            subprocess.Popen,
+            [executable, *argv],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        ),
+    )
+
+    stdout, stderr = await asyncio.gather(
+        _read_pipe(loop, process.stdout),
+        _read_pipe(loop, process.stderr),
+    )
+    # Both pipes hit EOF, so the child is exiting; reap it off the loop anyway.
+    return_code = await loop.run_in_executor(None, process.wait)
+    return return_code, stdout, stderr
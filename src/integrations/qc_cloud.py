@@ -1,8 +1,93 @@
 # Placeholder for QuantConnect Cloud integration logic
 # e.g., functions to submit backtests, fetch results, manage projects via QC API
 import asyncio
-import subprocess
-import shlex # Import shlex for safer command construction
+import hashlib
+import json
+import logging
+import os
+import re
+import shlex
+import shutil
+import tempfile
+import time
+from typing import Callable, Sequence
+from .lean_cli import run_lean, DEFAULT_IO_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Backtest ID as printed by `lean cloud backtest`, e.g. "Backtest id: XXX" or "... with backtestId XXX"
+_BACKTEST_ID_RE = re.compile(r"backtest\s?id[:\s]+(\S+)", re.IGNORECASE)
+
+# What `lean whoami` prints (with exit status 0) when no credentials are configured
+_NOT_LOGGED_IN_RE = re.compile(r"not logged in", re.IGNORECASE)
+
+# Content hash of each project as of its last successful `lean cloud push`
+_PUSH_STATE_PATH = os.path.join(os.path.expanduser("~"), ".alphaforge", "push_state.json")
+
+# Process-wide bridge returned by QuantConnectCloudBridge.instance()
+_INSTANCE = None
+
+
+def _parse_submit_output(output: str) -> dict:
+    """Extracts the backtest ID from `lean cloud backtest` output."""
+    match = _BACKTEST_ID_RE.search(output)
+    return {"backtest_id": match.group(1) if match else None}
+
+
+def _hash_project_dir(path: str) -> str | None:
+    """
+    Cheap fingerprint of a local project: blake2b over the sorted relative
+    paths, mtimes and sizes of its files (contents are not read). Returns None
+    if `path` is not a directory.
+
+    Symlinked files count with their target's stats; a broken link counts with
+    its own, and a file deleted mid-walk is left out.
+    """
+    if not os.path.isdir(path):
+        return None
+    entries = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(root, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                try:
+                    st = os.lstat(full)
+                except OSError:
+                    continue
+            entries.append((os.path.relpath(full, path), st.st_mtime_ns, st.st_size))
+    digest = hashlib.blake2b(digest_size=16)
+    for rel, mtime_ns, size in sorted(entries):
+        digest.update(f"{rel}\0{mtime_ns}\0{size}\n".encode())
+    return digest.hexdigest()
+
+
+def _load_push_state() -> dict:
+    try:
+        with open(_PUSH_STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_push_state(state: dict):
+    """
+    Writes the state to a temp file next to it and renames it into place, so
+    concurrent saves can't interleave and a crash never leaves a truncated
+    file: readers see either the old state or the new one.
+    """
+    directory = os.path.dirname(_PUSH_STATE_PATH)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".push_state.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, _PUSH_STATE_PATH)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
 
 class QuantConnectCloudBridge:
     """
@@ -11,38 +96,125 @@ class QuantConnectCloudBridge:
     where this code is executed (e.g., the mcp_server container).
     """
 
-    async def _execute_lean_command(self, command: str) -> dict:
-        """Executes a LEAN CLI command."""
-        # Use shlex.split to handle command parsing safely, especially with paths or names
-        # However, create_subprocess_shell expects a single string command
-        # For simplicity here, we'll stick to the f-string approach like LeanBridge,
-        # but be mindful of potential injection risks if user input forms commands directly.
-        # A safer approach might involve create_subprocess_exec with a list of args.
-        full_command = f"lean {command}"
-        print(f"Executing QC Cloud command: {full_command}")
+    # Fixed argv prefixes of the LEAN CLI subcommands used below. Methods only
+    # append their per-call arguments, so no command strings are built or quoted.
+    _WHOAMI = ("whoami",)
+    _PUSH = ("cloud", "push")
+    _BACKTEST = ("cloud", "backtest")
+    _LIVE_DEPLOY = ("cloud", "live", "deploy")
+    _STATUS = ("cloud", "status")
+    _PROJECTS = ("cloud", "projects")
+    _CREATE = ("project-create",)
+
+    def __init__(self, status_cache_ttl: float = 2.0, io_semaphore: asyncio.Semaphore | None = None,
+                 projects_dir: str | None = None):
+        """
+        Args:
+            status_cache_ttl: Seconds a successful status result is reused before
+                              `lean` is spawned again. Frontends polling project
+                              status hit the cache instead of the CLI.
+            io_semaphore: Caps how many `lean` processes run at once. Pass a shared
+                          semaphore to apply one limit across several bridges.
+            projects_dir: Local directory holding the project folders, used to
+                          detect unchanged projects before pushing. Defaults
+                          to QC_PROJECTS_DIR.
+        """
+        self._io_sem = io_semaphore or asyncio.Semaphore(DEFAULT_IO_CONCURRENCY)
+        self._ttl = status_cache_ttl
+        # project -> (time.monotonic() of fetch, result); expired entries are
+        # dropped whenever a new result is stored
+        self._status_cache: dict[str, tuple[float, dict]] = {}
+        # project -> status fetch in progress, so concurrent polls share one spawn;
+        # an entry is removed as soon as its fetch finishes
+        self._status_fetches: dict[str, asyncio.Future] = {}
+        # Resolve the CLI once instead of searching $PATH on every spawn
+        self._lean_path = shutil.which("lean") or "lean"
+        # Set once `lean whoami` has succeeded; the check then never runs again
+        self._login_verified = False
+        self._login_lock = asyncio.Lock()
+        self._projects_dir = projects_dir or os.getenv("QC_PROJECTS_DIR", "./QuantConnect Projects")
+        # Project names seen in the cloud; None until list_projects has run once
+        self._known_projects: set[str] | None = None
+        # project -> content hash at last successful push; loaded on first push
+        self._push_state: dict[str, str] | None = None
+        # Serializes loading and saving it, so concurrent pushes neither load it
+        # twice nor let an older snapshot replace a newer one on disk
+        self._push_state_lock = asyncio.Lock()
+
+    @classmethod
+    def instance(cls, **kwargs) -> "QuantConnectCloudBridge":
+        """
+        Returns the process-wide bridge, creating it with `kwargs` on the first
+        call. Sharing one instance keeps its status cache and login check from
+        being thrown away per request.
+
+        Raises RuntimeError if kwargs are passed once the bridge exists: they
+        could not be applied, and silently ignoring them would e.g. leave a
+        second server's LeanBridge and the cloud bridge on different semaphores.
+        """
+        global _INSTANCE
+        if _INSTANCE is None:
+            _INSTANCE = cls(**kwargs)
+        elif kwargs:
+            raise RuntimeError(
+                "QuantConnectCloudBridge.instance() was already created; "
+                f"cannot apply {sorted(kwargs)} to it")
+        return _INSTANCE
+
+    async def _verify_login(self) -> bool:
+        """Runs `lean whoami` once per process and remembers a successful result."""
+        async with self._login_lock:
+            if not self._login_verified:
+                async with self._io_sem:
+                    return_code, stdout, stderr = await run_lean(self._WHOAMI, self._lean_path)
+                # `lean whoami` exits 0 even when logged out; it just prints "You are not logged in"
+                self._login_verified = return_code == 0 and not _NOT_LOGGED_IN_RE.search(stdout + stderr)
+                if not self._login_verified:
+                    logger.error("LEAN CLI is not logged in")
+        return self._login_verified
+
+    async def _execute_lean_command(self, argv: Sequence[str],
+                                    parser: Callable[[str], dict] | None = None) -> dict:
+        """
+        Executes a LEAN CLI command given as a sequence of argv tokens (without 'lean').
+
+        Args:
+            parser: Optional callable run once over the decoded stdout of a
+                    successful command; the dict it returns is merged into the
+                    result, so callers read fields instead of re-parsing output.
+        """
+        # The arguments go straight to exec, so no shell is spawned and names
+        # containing spaces or shell metacharacters need no quoting.
+        logger.info("Executing QC Cloud command: %s", shlex.join(["lean", *argv]))
         try:
-            process = await asyncio.create_subprocess_shell(
-                full_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
+            if not self._login_verified and not await self._verify_login():
+                return {
+                    "success": False,
+                    "output": "",
+                    "error": "LEAN CLI is not logged in. Run 'lean login' or check QC_USER_ID/QC_API_TOKEN.",
+                    "return_code": -1
+                }
 
-            stdout_decoded = stdout.decode(errors='replace') if stdout else ""
-            stderr_decoded = stderr.decode(errors='replace') if stderr else ""
+            # run_lean reads the output in chunks and decodes it once at EOF
+            async with self._io_sem:
+                return_code, stdout_decoded, stderr_decoded = await run_lean(argv, self._lean_path)
 
-            print(f"Return Code: {process.returncode}")
-            print(f"STDOUT:\n{stdout_decoded}")
-            print(f"STDERR:\n{stderr_decoded}")
+            logger.info("Return Code: %s", return_code)
+            # The output dumps can be large; they are only formatted when DEBUG is enabled
+            logger.debug("STDOUT:\n%s", stdout_decoded)
+            logger.debug("STDERR:\n%s", stderr_decoded)
 
-            return {
-                "success": process.returncode == 0,
+            result = {
+                "success": return_code == 0,
                 "output": stdout_decoded,
                 "error": stderr_decoded,
-                "return_code": process.returncode
+                "return_code": return_code
             }
+            if parser is not None and result["success"]:
+                result.update(parser(stdout_decoded))
+            return result
         except FileNotFoundError:
-            print("Error: 'lean' command not found. Is LEAN CLI installed and in PATH?")
+            logger.error("'lean' command not found. Is LEAN CLI installed and in PATH?")
             return {
                 "success": False,
                 "output": "",
@@ -50,7 +222,7 @@ class QuantConnectCloudBridge:
                 "return_code": -1
             }
         except Exception as e:
-            print(f"An unexpected error occurred executing LEAN command: {e}")
+            logger.exception("An unexpected error occurred executing LEAN command: %s", e)
             return {
                 "success": False,
                 "output": "",
@@ -58,23 +230,58 @@ class QuantConnectCloudBridge:
                 "return_code": -1
             }
 
+    def _project_dir(self, project_name_or_id: str) -> str | None:
+        """
+        Local directory of a project, or None if the name is absolute or uses
+        '..' to point outside projects_dir (names come from tool requests).
+        """
+        root = os.path.abspath(self._projects_dir)
+        path = os.path.normpath(os.path.join(root, project_name_or_id))
+        if path == root or os.path.commonpath((root, path)) != root:
+            return None
+        return path
+
     async def push_changes(self, project_name_or_id: str) -> dict:
         """
         Pushes local project changes to QuantConnect Cloud.
         Required before running cloud backtests on updated code.
 
+        If the local project directory has not changed since the last
+        successful push (same files, mtimes and sizes), `lean` is not run and
+        the result has "skipped" set. Names that would resolve outside
+        projects_dir are rejected without running `lean`.
+
         Args:
             project_name_or_id: The name or ID of the QuantConnect project.
-                                Use quotes if the name contains spaces.
         """
-        # Ensure project name is quoted if it contains spaces, although LEAN CLI might handle this.
-        # Using shlex.quote might be more robust if constructing complex commands.
-        safe_project_arg = shlex.quote(project_name_or_id)
         # The command structure for push might need refinement based on specific needs
         # e.g., specifying files --lean-config, --project-id etc.
         # Assuming basic push of the project linked in the current directory context:
-        command = f"cloud push {safe_project_arg}"
-        return await self._execute_lean_command(command)
+        project_dir = self._project_dir(project_name_or_id)
+        if project_dir is None:
+            return {
+                "success": False,
+                "output": "",
+                "error": f"Invalid project name: {project_name_or_id!r}",
+                "return_code": -1
+            }
+        content_hash = await asyncio.to_thread(_hash_project_dir, project_dir)
+        async with self._push_state_lock:
+            if self._push_state is None:
+                self._push_state = await asyncio.to_thread(_load_push_state)
+        if content_hash is not None and self._push_state.get(project_name_or_id) == content_hash:
+            logger.info("Project %s unchanged since last push; skipping", project_name_or_id)
+            return {"success": True, "skipped": True, "output": "", "error": "", "return_code": 0}
+
+        result = await self._execute_lean_command(self._PUSH + (project_name_or_id,))
+        if result["success"] and content_hash is not None:
+            async with self._push_state_lock:
+                self._push_state[project_name_or_id] = content_hash
+                try:
+                    await asyncio.to_thread(_save_push_state, dict(self._push_state))
+                except OSError as e:
+                    logger.warning("Could not save push state to %s: %s", _PUSH_STATE_PATH, e)
+        return result
 
 
     async def submit_cloud_backtest(self, project_name_or_id: str, backtest_name: str | None = None) -> dict:
@@ -83,27 +290,25 @@ class QuantConnectCloudBridge:
 
         Args:
             project_name_or_id: The name or ID of the QuantConnect project.
-                                Use quotes if the name contains spaces.
             backtest_name: Optional name for the backtest run in the cloud.
 
         Returns:
             Dictionary containing the success status and output/error messages.
+            On success it also carries "backtest_id", parsed from the output
+            (None if the CLI did not print one).
             Note: This initiates the backtest; it doesn't wait for completion or return results directly.
-                  The output might contain the backtest ID for later retrieval.
         """
-        safe_project_arg = shlex.quote(project_name_or_id)
-        command = f"cloud backtest {safe_project_arg}"
+        argv = self._BACKTEST + (project_name_or_id,)
         if backtest_name:
-            # Add the --backtest-name option, ensuring proper quoting
-            command += f" --backtest-name {shlex.quote(backtest_name)}"
+            argv += ("--backtest-name", backtest_name)
 
         # Consider pre-pushing changes if necessary
         # push_result = await self.push_changes(project_name_or_id)
         # if not push_result["success"]:
         #     return {"success": False, "error": f"Failed to push changes before backtest: {push_result['error']}"}
-        # print("Successfully pushed changes to the cloud.")
+        # logger.info("Successfully pushed changes to the cloud.")
 
-        return await self._execute_lean_command(command)
+        return await self._execute_lean_command(argv, parser=_parse_submit_output)
 
     # --- Placeholder methods for other potential interactions ---
 
@@ -116,24 +321,44 @@ class QuantConnectCloudBridge:
         # Example: lean cloud backtest <project> --backtest-id <backtest-id> --open ?
         # Or potentially lean report --backtest-id <backtest-id> ?
         # This needs verification against LEAN CLI capabilities or direct API use.
-        print(f"Fetching results for backtest {backtest_id} in project {project_name_or_id} (Not Implemented)")
+        logger.warning("Fetching results for backtest %s in project %s (Not Implemented)", backtest_id, project_name_or_id)
         return {"success": False, "error": "Fetching specific backtest results via CLI not fully implemented/verified."}
 
     async def deploy_live(self, project_name_or_id: str, environment_name: str) -> dict:
         """
         (Placeholder) Deploys a project to a live trading environment on QC Cloud.
         """
-        safe_project_arg = shlex.quote(project_name_or_id)
-        safe_env_arg = shlex.quote(environment_name)
-        command = f"cloud live deploy {safe_project_arg} --environment {safe_env_arg}"
-        print(f"Deploying project {project_name_or_id} to {environment_name} (Not Implemented)")
-        return await self._execute_lean_command(command) # Example execution
+        argv = self._LIVE_DEPLOY + (project_name_or_id, "--environment", environment_name)
+        logger.warning("Deploying project %s to %s (Not Implemented)", project_name_or_id, environment_name)
+        return await self._execute_lean_command(argv) # Example execution
+
+    async def _cached_status(self, project_name_or_id: str) -> dict:
+        """
+        Runs `lean cloud status`, reusing a successful result younger than the
+        TTL. Every caller gets its own copy of the result.
+        """
+        cached = self._status_cache.get(project_name_or_id)
+        if cached and time.monotonic() - cached[0] < self._ttl:
+            return dict(cached[1])
+        fetch = self._status_fetches.get(project_name_or_id)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._fetch_status(project_name_or_id))
+            self._status_fetches[project_name_or_id] = fetch
+            fetch.add_done_callback(lambda _: self._status_fetches.pop(project_name_or_id, None))
+        # shield: one caller being cancelled must not cancel the fetch others await
+        return dict(await asyncio.shield(fetch))
+
+    async def _fetch_status(self, project_name_or_id: str) -> dict:
+        result = await self._execute_lean_command(self._STATUS + (project_name_or_id,))
+        if result["success"]:
+            now = time.monotonic()
+            self._status_cache = {k: v for k, v in self._status_cache.items() if now - v[0] < self._ttl}
+            self._status_cache[project_name_or_id] = (now, result)
+        return result
 
     async def get_project_status(self, project_name_or_id: str) -> dict:
-        """Get the current status of a cloud project."""
-        safe_project_arg = shlex.quote(project_name_or_id)
-        command = f"cloud status {safe_project_arg}"
-        return await self._execute_lean_command(command)
+        """Get the current status of a cloud project (cached for status_cache_ttl seconds)."""
+        return await self._cached_status(project_name_or_id)
 
     async def create_project(self, project_name: str, language: str = "python") -> dict:
         """
@@ -142,30 +367,45 @@ class QuantConnectCloudBridge:
         Args:
             project_name: Name for the new project
             language: 'python' or 'csharp' (default: 'python')
+
+        If the project is already known to exist in the cloud, `lean` is not
+        run and the result has "cached" set. Known projects are those seen by
+        list_projects plus the ones created through this bridge.
         """
-        safe_name = shlex.quote(project_name)
-        command = f"project-create {safe_name} --language {language}"
-        return await self._execute_lean_command(command)
+        if self._known_projects is None:
+            await self.list_projects()
+            if self._known_projects is None:
+                # The listing failed; don't try it again on every create, just
+                # remember the projects created from here on
+                self._known_projects = set()
+        if project_name in self._known_projects:
+            return {"success": True, "cached": True, "output": "", "error": "", "return_code": 0}
+
+        result = await self._execute_lean_command(self._CREATE + (project_name, "--language", language))
+        if result["success"]:
+            self._known_projects.add(project_name)
+        return result
 
     async def get_backtest_status(self, project_name_or_id: str, backtest_id: str) -> dict:
         """
         Check the status of a running backtest.
         This complements submit_cloud_backtest for monitoring progress.
+        Note: `lean cloud status` currently only takes a project (and reports
+        its live status), so this needs verification against LEAN CLI
+        capabilities or direct API use; it is not cached.
         """
-        safe_project_arg = shlex.quote(project_name_or_id)
-        command = f"cloud status {safe_project_arg} --backtest-id {shlex.quote(backtest_id)}"
-        return await self._execute_lean_command(command)
+        argv = self._STATUS + (project_name_or_id, "--backtest-id", backtest_id)
+        return await self._execute_lean_command(argv)
 
     async def list_projects(self) -> dict:
         """
         List projects available in the QuantConnect Cloud account.
         Uses the LEAN CLI 'cloud projects' command.
         """
-        command = "cloud projects"
-        result = await self._execute_lean_command(command)
+        result = await self._execute_lean_command(self._PROJECTS)
 
         if not result["success"]:
-            print(f"Error listing projects: {result.get('error')}")
+            logger.error("Error listing projects: %s", result.get('error'))
             return {
                 "success": False,
                 "error": result.get('error', 'Unknown error listing projects'),
@@ -190,6 +430,7 @@ class QuantConnectCloudBridge:
                     project_id = parts[0].strip()
                     project_name = parts[1].strip()
                     projects.append({"id": project_id, "name": project_name})
+        self._known_projects = {p["name"] for p in projects}
 
         return {
             "success": True,
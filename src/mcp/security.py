@@ -1,13 +1,18 @@
 from typing import List, Optional
 
+# Error messages returned by OAuth2Authenticator.check
+INVALID_TOKEN = "Invalid authentication token"
+NOT_AUTHORIZED = "Not authorized to use this tool"
+
 class OAuth2Authenticator:
     """
     Simple OAuth2 authenticator for the MCP server.
     """
     
     def __init__(self, allowed_domains: List[str] = None, auto_approve_tools: List[str] = None):
-        self.allowed_domains = allowed_domains or []
-        self.auto_approve_tools = auto_approve_tools or []
+        # frozensets give O(1) membership checks on the per-request auth path
+        self.allowed_domains = frozenset(allowed_domains or ())
+        self.auto_approve_tools = frozenset(auto_approve_tools or ())
         
     def authenticate(self, token: str) -> bool:
         """
@@ -23,3 +28,14 @@ class OAuth2Authenticator:
         """
         # For this prototype, we'll just check if the tool is in the auto-approve list
         return tool_name in self.auto_approve_tools
+
+    def check(self, token: str, tool_name: str) -> Optional[str]:
+        """
+        Authenticates the token and authorizes it for the tool in one call.
+        Returns None if the request may proceed, otherwise an error message.
+        """
+        if not self.authenticate(token):
+            return INVALID_TOKEN
+        if not self.authorize(token, tool_name):
+            return NOT_AUTHORIZED
+        return None
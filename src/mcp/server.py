@@ -1,10 +1,119 @@
 import asyncio
+import functools
+import inspect
+import logging
+import os
+import orjson
 import uvicorn
-from fastapi import FastAPI, Request, Depends, HTTPException
+from fastapi import FastAPI, Request, Depends, HTTPException, Body
 from fastapi.responses import JSONResponse
+from pydantic import create_model
 from typing import List, Callable, Dict, Any, Optional, Union
 from .tools import Tool, Resource
-from .security import OAuth2Authenticator
+from .security import OAuth2Authenticator, INVALID_TOKEN
+
+logger = logging.getLogger(__name__)
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson, which is several times faster than the
+    stdlib encoder for the large LEAN CLI output strings tools return.
+    (Defined here because fastapi.responses.ORJSONResponse is deprecated in
+    newer FastAPI releases.)
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Maps the type names used in @Tool(params=...) to Python types for request models
+_PARAM_TYPES = {"str": str, "int": int, "float": float, "bool": bool, "dict": dict, "list": list}
+
+
+def _param_annotation(type_name: str):
+    """Resolves a @Tool param type name such as 'str' or 'Optional[str]'."""
+    if type_name.startswith("Optional[") and type_name.endswith("]"):
+        return Optional[_PARAM_TYPES.get(type_name[len("Optional["):-1], Any)]
+    return _PARAM_TYPES.get(type_name, Any)
+
+
+def _build_request_model(tool: Callable):
+    """
+    Builds a Pydantic model for a tool's JSON body from its declared params.
+    Defaults come from the tool's signature; params without one are required.
+    """
+    signature = inspect.signature(tool)
+    fields = {}
+    for name, type_name in tool.params.items():
+        param = signature.parameters.get(name)
+        has_default = param is not None and param.default is not inspect.Parameter.empty
+        fields[name] = (_param_annotation(type_name), param.default if has_default else ...)
+    return create_model(f"{tool.name}_request", **fields)
+
+
+async def _invoke_tool(call: Callable, body) -> Any:
+    """Calls a tool with its validated request body, turning failures into a 500."""
+    try:
+        return await call(**(dict(body) if body is not None else {}))
+    except Exception as e:
+        return ORJSONResponse(
+            status_code=500,
+            content={"error": f"Tool execution failed: {str(e)}"}
+        )
+
+
+def _check_auth(request: Request, tool_name: str):
+    """
+    Raises HTTPException unless the request's bearer token may use the tool.
+    The authenticator is read from app.state per request, so it may be set
+    (e.g. by McpServer.run) after the tools were registered.
+    """
+    authenticator = request.app.state.authenticator
+    if not authenticator:
+        return
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        raise HTTPException(status_code=401, detail="Authentication required")
+    token = auth_header.replace('Bearer ', '')
+    error = authenticator.check(token, tool_name)
+    if error is not None:
+        status_code = 401 if error == INVALID_TOKEN else 403
+        raise HTTPException(status_code=status_code, detail=error)
+
+
+def _make_tool_endpoint(call: Callable, tool_name: str, request_model, require_auth: bool) -> Callable:
+    """
+    Builds the endpoint for one tool. FastAPI reads the body model from the
+    endpoint's signature, so each tool needs its own small function; it only
+    captures what that tool needs, and the shared logic lives in the helpers above.
+
+    If every param has a default the body may be omitted, and the tool is
+    called with its defaults; otherwise a missing body is a 422.
+    """
+    body_required = any(field.is_required() for field in request_model.model_fields.values())
+    body_param = Body(...) if body_required else Body(None)
+    if require_auth:
+        async def tool_endpoint(request: Request, body: request_model = body_param):
+            _check_auth(request, tool_name)
+            return await _invoke_tool(call, body)
+    else:
+        async def tool_endpoint(body: request_model = body_param):
+            return await _invoke_tool(call, body)
+    return tool_endpoint
+
+
+def _make_resource_endpoint(resource: Resource) -> Callable:
+    """Builds the GET endpoint for one resource."""
+    async def resource_endpoint():
+        try:
+            return await resource.get_data()
+        except Exception as e:
+            return ORJSONResponse(
+                status_code=500,
+                content={"error": f"Resource access failed: {str(e)}"}
+            )
+    return resource_endpoint
+
 
 class McpServer:
     """
@@ -16,10 +125,19 @@ class McpServer:
         self.name = name
         self.tools = []
         self.resources = []
+        self.app = FastAPI(title=name, description=f"{name} API", default_response_class=ORJSONResponse)
         self.authenticator = None
-        self.app = FastAPI(title=name, description=f"{name} API")
         self._setup_routes()
 
+    @property
+    def authenticator(self) -> Optional[OAuth2Authenticator]:
+        return self.app.state.authenticator
+
+    @authenticator.setter
+    def authenticator(self, authenticator: Optional[OAuth2Authenticator]):
+        # Stored on app.state, where tool endpoints look it up per request
+        self.app.state.authenticator = authenticator
+
     def _setup_routes(self):
         """Set up API routes."""
         @self.app.get("/")
@@ -34,43 +152,19 @@ class McpServer:
         """Add tools to the server."""
         self.tools.extend(tools)
 
-        # Register each tool as an API endpoint
+        # Register each tool as an API endpoint. Everything that doesn't depend on
+        # the request is decided here, once: the body model FastAPI/Pydantic parse
+        # and validate against, whether auth is checked, and how the tool is called.
         for tool in tools:
             if hasattr(tool, 'name') and hasattr(tool, 'description') and hasattr(tool, 'params'):
                 route_path = f"/tools/{tool.name}"
-
-                # Create a dynamic route handler for this tool
-                async def create_tool_endpoint(request: Request, tool_func=tool):
-                    # Parse request body
-                    try:
-                        data = await request.json()
-                    except Exception:
-                        data = {}
-
-                    # Check authentication if required
-                    if hasattr(tool_func, 'require_auth') and tool_func.require_auth and self.authenticator:
-                        auth_header = request.headers.get('Authorization')
-                        if not auth_header or not auth_header.startswith('Bearer '):
-                            raise HTTPException(status_code=401, detail="Authentication required")
-                        token = auth_header.replace('Bearer ', '')
-                        if not self.authenticator.authenticate(token):
-                            raise HTTPException(status_code=401, detail="Invalid authentication token")
-                        if not self.authenticator.authorize(token, tool_func.name):
-                            raise HTTPException(status_code=403, detail="Not authorized to use this tool")
-
-                    # Execute the tool with the provided parameters
-                    try:
-                        result = await tool_func(self, **data)
-                        return result
-                    except Exception as e:
-                        return JSONResponse(
-                            status_code=500,
-                            content={"error": f"Tool execution failed: {str(e)}"}
-                        )
-
-                # Register the endpoint
-                self.app.post(route_path)(create_tool_endpoint)
-                print(f"Registered tool endpoint: {route_path}")
+                # Plain functions (e.g. the server's local_backtest) take the server as
+                # their first argument; bound methods already carry their own instance.
+                call = tool if inspect.ismethod(tool) else functools.partial(tool, self)
+                endpoint = _make_tool_endpoint(
+                    call, tool.name, _build_request_model(tool), getattr(tool, 'require_auth', False))
+                self.app.post(route_path)(endpoint)
+                logger.debug("Registered tool endpoint: %s", route_path)
 
     def add_resources(self, resources: List[Resource]):
         """Add resources to the server."""
@@ -80,26 +174,36 @@ class McpServer:
         for resource in resources:
             if hasattr(resource, 'name') and hasattr(resource, 'description'):
                 route_path = f"/resources/{resource.name}"
-
-                # Create a dynamic route handler for this resource
-                async def create_resource_endpoint(resource_obj=resource):
-                    try:
-                        return resource_obj.get_data()
-                    except Exception as e:
-                        return JSONResponse(
-                            status_code=500,
-                            content={"error": f"Resource access failed: {str(e)}"}
-                        )
-
-                # Register the endpoint
-                self.app.get(route_path)(create_resource_endpoint)
-                print(f"Registered resource endpoint: {route_path}")
-
-    def run(self, host: str = "0.0.0.0", port: int = 8080, authenticator: Optional[OAuth2Authenticator] = None):
-        """Run the server."""
+                self.app.get(route_path)(_make_resource_endpoint(resource))
+                logger.debug("Registered resource endpoint: %s", route_path)
+
+    def run(self, host: str = "0.0.0.0", port: int = 8080, authenticator: Optional[OAuth2Authenticator] = None,
+            workers: Optional[int] = None, app_factory: Optional[str] = None):
+        """
+        Run the server.
+
+        `workers` defaults to the MCP_WORKERS env var (1). With more than one
+        worker, uvicorn imports the app in each worker process, so `app_factory`
+        must be an import string ("module:function") for a function that builds
+        and returns the FastAPI app (including its authenticator); each worker
+        then gets its own tools, bridges and subprocess state.
+        """
         self.authenticator = authenticator
-        print(f"Starting {self.name} on {host}:{port}")
-        print(f"Server is running with {len(self.tools)} tools and {len(self.resources)} resources")
-
-        # Start the FastAPI server
-        uvicorn.run(self.app, host=host, port=port)
+        workers = workers or int(os.getenv("MCP_WORKERS", "1"))
+        if workers > 1 and not app_factory:
+            raise ValueError("Running with more than one worker requires an app_factory import string")
+        logger.info("Starting %s on %s:%s with %d worker(s)", self.name, host, port, workers)
+        logger.info("Server is running with %d tools and %d resources", len(self.tools), len(self.resources))
+
+        # Start the FastAPI server. loop/http "auto" select uvloop and httptools
+        # (C HTTP parser) when installed, falling back to asyncio/h11 otherwise.
+        uvicorn.run(
+            app_factory if workers > 1 else self.app,
+            factory=workers > 1,
+            host=host,
+            port=port,
+            workers=workers,
+            loop="auto",
+            http="auto",
+            log_level="warning",
+        )
@@ -1,5 +1,7 @@
-import json
+import asyncio
+import inspect
 import os
+import orjson
 from typing import Callable, Dict, Any, List, Optional
 
 class Tool:
@@ -34,13 +36,44 @@ class Resource:
         self.description = description
         self.access_method = access_method
         self.access_path = access_path
+        # (st_mtime_ns, parsed data) from the last read of access_path
+        self._cache: tuple[int, Any] | None = None
+        self._lock = asyncio.Lock()
         
-    def get_data(self) -> Dict[str, Any]:
+    async def get_data(self) -> Dict[str, Any]:
         """Get the resource data."""
         if self.access_method:
-            return self.access_method()
-        elif self.access_path and os.path.exists(self.access_path):
-            with open(self.access_path, 'r') as f:
-                return json.load(f)
+            if inspect.iscoroutinefunction(self.access_method):
+                return await self.access_method()
+            # Plain callables run on a worker thread; ones that return an
+            # awaitable (e.g. a lambda calling an async method) are awaited here.
+            result = await asyncio.to_thread(self.access_method)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        elif self.access_path:
+            # No separate existence check: the stat in _read_file fails the same
+            # way, with one syscall and no race against the file being replaced.
+            try:
+                return await self._read_file()
+            except FileNotFoundError:
+                return {"error": "Resource not available"}
         else:
             return {"error": "Resource not available"}
+
+    async def _read_file(self) -> Dict[str, Any]:
+        """
+        Returns the parsed file, re-reading it only when its mtime changes:
+        one stat per cache hit, one stat plus one read per miss.
+        """
+        async with self._lock:
+            mtime = (await asyncio.to_thread(os.stat, self.access_path)).st_mtime_ns
+            if self._cache is not None and self._cache[0] == mtime:
+                return self._cache[1]
+            data = await asyncio.to_thread(self._load_file)
+            self._cache = (mtime, data)
+            return data
+
+    def _load_file(self) -> Dict[str, Any]:
+        with open(self.access_path, 'rb') as f:
+            return orjson.loads(f.read())
@@ -1,38 +1,45 @@
-import subprocess
 import asyncio
+import logging
+import shlex
+import shutil
+from ..integrations.lean_cli import run_lean, DEFAULT_IO_CONCURRENCY
+
+logger = logging.getLogger(__name__)
 
 class LeanBridge:
-    async def execute(self, command: str):
+    def __init__(self, io_semaphore: asyncio.Semaphore | None = None):
+        # Caps how many `lean` processes run at once; the server passes a semaphore
+        # shared with the cloud bridge so the limit covers both.
+        self._io_sem = io_semaphore or asyncio.Semaphore(DEFAULT_IO_CONCURRENCY)
+        # Resolve the CLI once instead of searching $PATH on every spawn
+        self._lean_path = shutil.which("lean") or "lean"
+
+    async def execute(self, args: list[str]):
         """Execute LEAN CLI command inside the container"""
         # Ensure the command is executed in the context where LEAN CLI is available
         # This might depend on the docker setup (e.g., executing within lean_engine service or ensuring LEAN CLI is in mcp_server)
         # For now, assuming `lean` is accessible in the environment where this script runs.
-        full_command = f"lean {command}" # Consider adding path to lean if not in PATH
-        print(f"Executing command: {full_command}")
+        # Arguments are passed straight to exec (no shell), so no quoting is needed.
+        logger.info("Executing command: %s", shlex.join(["lean", *args]))
         try:
-            process = await asyncio.create_subprocess_shell(
-                full_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
-            
-            # Decode stdout and stderr, handling potential decoding errors
-            stdout_decoded = stdout.decode(errors='replace') if stdout else ""
-            stderr_decoded = stderr.decode(errors='replace') if stderr else ""
+            # run_lean forks on a worker thread so a slow exec doesn't stall the event loop,
+            # and reads the output in chunks into one buffer, decoded once at EOF
+            async with self._io_sem:
+                return_code, stdout_decoded, stderr_decoded = await run_lean(args, self._lean_path)
 
-            print(f"Return Code: {process.returncode}")
-            print(f"STDOUT:\n{stdout_decoded}")
-            print(f"STDERR:\n{stderr_decoded}")
+            logger.info("Return Code: %s", return_code)
+            # The output dumps can be large; they are only formatted when DEBUG is enabled
+            logger.debug("STDOUT:\n%s", stdout_decoded)
+            logger.debug("STDERR:\n%s", stderr_decoded)
 
             return {
-                "success": process.returncode == 0,
+                "success": return_code == 0,
                 "output": stdout_decoded,
                 "error": stderr_decoded,
-                "return_code": process.returncode
+                "return_code": return_code
             }
         except FileNotFoundError:
-            print("Error: 'lean' command not found. Is LEAN CLI installed and in PATH?")
+            logger.error("'lean' command not found. Is LEAN CLI installed and in PATH?")
             return {
                 "success": False,
                 "output": "",
@@ -40,7 +47,7 @@ class LeanBridge:
                 "return_code": -1
             }
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            logger.exception("An unexpected error occurred: %s", e)
             return {
                 "success": False,
                 "output": "",
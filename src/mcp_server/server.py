@@ -1,22 +1,59 @@
+import asyncio
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
 from mcp import McpServer, Tool, Resource
 from mcp.security import OAuth2Authenticator # Import authenticator directly
 from .bridge import LeanBridge
+from ..integrations.lean_cli import DEFAULT_IO_CONCURRENCY
 from ..integrations.qc_cloud import QuantConnectCloudBridge
 # Import the new tools and resources classes
 from .tools import TradingTools, TradingResources
 
+logger = logging.getLogger(__name__)
+
+
+def configure_logging(level: str | None = None) -> QueueListener:
+    """
+    Sends all log records through a queue so request handlers only enqueue them;
+    a background listener thread does the actual (blocking) writes to stderr.
+    The level defaults to the LOG_LEVEL env var, or INFO. Returns the started
+    listener so the caller can stop (and flush) it on shutdown.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = QueueListener(log_queue, stream_handler)
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
+    listener.start()
+    return listener
+
 class AlphaForgeServer(McpServer):
-    def __init__(self):
+    def __init__(self, io_concurrency: int = DEFAULT_IO_CONCURRENCY, compute_concurrency: int | None = None):
+        """
+        Args:
+            io_concurrency: Max LEAN CLI commands running at once across both bridges.
+            compute_concurrency: Max concurrent NLP parses (default: CPU count).
+        """
         super().__init__(name="AlphaForge v1.0")
-        
-        # Initialize tools and resources first
-        self.trading_tools = TradingTools()
+
+        # Separate limits so a burst of one kind of work can't starve the other
+        self.io_sem = asyncio.Semaphore(io_concurrency)
+        self.compute_sem = asyncio.Semaphore(compute_concurrency or os.cpu_count())
+
+        # Both bridges share io_sem
+        self.qc_cloud = QuantConnectCloudBridge.instance(io_semaphore=self.io_sem)
+        self.lean = LeanBridge(io_semaphore=self.io_sem) # Local LEAN bridge (if used)
+
+        # Initialize tools and resources
+        self.trading_tools = TradingTools(qc_bridge=self.qc_cloud)
         self.trading_resources = TradingResources()
         
-        # Initialize other components
-        self.lean = LeanBridge() # Local LEAN bridge (if used)
-        self.qc_cloud = self.trading_tools.qc_bridge # Use the instance from TradingTools
-        
         # Configure authenticator
         self.authenticator = OAuth2Authenticator(
             allowed_domains=["quantconnect.com"], # Example domain
@@ -38,15 +75,17 @@ class AlphaForgeServer(McpServer):
         )
         async def local_backtest(_, strategy_description: str):
             from ..nlp.gemini_parser import parse_gemini_response 
-            config = parse_gemini_response(strategy_description)
+            async with self.compute_sem:
+                # The Gemini call is awaited on the loop; compute_sem still caps concurrent parses
+                config = await parse_gemini_response(strategy_description)
             
             # Simplified example: Assume parser gives a path or name
             algorithm_identifier = config.get('algorithm_path', config.get('strategy_type', 'BasicTemplateAlgorithm'))
-            lean_command = f"backtest {algorithm_identifier}" 
+            lean_args = ["backtest", algorithm_identifier]
 
-            print(f"Executing LOCAL LEAN command: {lean_command}")
-            result = await self.lean.execute(lean_command)
-            print(f"LOCAL LEAN execution result: {result}")
+            logger.info("Executing LOCAL LEAN command: %s", lean_args)
+            result = await self.lean.execute(lean_args)
+            logger.debug("LOCAL LEAN execution result: %s", result)
 
             return {
                 "status": "success" if result.get("success") else "error",
@@ -64,7 +103,7 @@ class AlphaForgeServer(McpServer):
         # Combine local tools (if any) and trading tools
         all_tools = [local_backtest] + trading_tool_methods
         self.add_tools(all_tools)
-        print(f"Registered tools: {[tool.name for tool in all_tools]}")
+        logger.info("Registered tools: %s", [tool.name for tool in all_tools])
 
     def register_resources(self):
         """Registers resources available on the server."""
@@ -73,12 +112,25 @@ class AlphaForgeServer(McpServer):
             self.trading_resources.risk_parameters
         ]
         self.add_resources(resources_list)
-        print(f"Registered resources: {[res.name for res in resources_list]}")
+        logger.info("Registered resources: %s", [res.name for res in resources_list])
+
+
+def create_app():
+    """
+    App factory used by uvicorn when MCP_WORKERS > 1. Each worker process
+    calls it, so every worker builds its own server and bridges instead of
+    sharing subprocess state across forks.
+    """
+    configure_logging()
+    return AlphaForgeServer().app
 
 
 if __name__ == "__main__":
-    print("Starting AlphaForge v1.0 MCP Server...")
+    log_listener = configure_logging()
+    logger.info("Starting AlphaForge v1.0 MCP Server...")
     server = AlphaForgeServer()
     # Run the server with the authenticator
-    server.run(host="0.0.0.0", port=8080, authenticator=server.authenticator)
-    print("AlphaForge v1.0 MCP Server stopped.") 
\ No newline at end of file
+    server.run(host="0.0.0.0", port=8080, authenticator=server.authenticator,
+               app_factory="src.mcp_server.server:create_app")
+    logger.info("AlphaForge v1.0 MCP Server stopped.")
+    log_listener.stop() 
\ No newline at end of file
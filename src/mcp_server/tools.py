@@ -3,18 +3,86 @@
 
 from mcp import Tool, Resource
 from typing import Optional, Dict, List
-from datetime import datetime # Added missing import
+from datetime import datetime, timezone # Added missing import
 # Corrected import path for QuantConnectCloudBridge
 from ..integrations.qc_cloud import QuantConnectCloudBridge 
 # Removed import for deploy_live_with_confirmation as it's not implemented yet
 # from ..integrations.qc_cloud import deploy_live_with_confirmation 
-import shlex
+import asyncio
+import functools
+import logging
 import os
-import re # Import re for _extract_backtest_id
+import re # Import re for _SYMBOL_RE
+import time
+
+logger = logging.getLogger(__name__)
+
+_UTC = timezone.utc
+
+# Compiled once; the group is non-capturing since only the match matters
+_SYMBOL_RE = re.compile(r'^[A-Z]{1,5}(?:USD)?$')
+
+
+@functools.lru_cache(maxsize=1)
+def _allowed_symbols() -> frozenset:
+    """Symbol whitelist from ALLOWED_SYMBOLS, read once per process."""
+    return frozenset(
+        s.strip().upper()
+        for s in os.getenv("ALLOWED_SYMBOLS", "SPY,QQQ,AAPL,GOOG,BTCUSD,ETHUSD").split(",")
+    )
+
+def _validate_symbol(symbol: str):
+    """Basic check for symbol format or whitelist (example)."""
+    sym = symbol.upper()
+    n = len(sym)
+    # Example: Allow common stock/crypto formats.
+    # Plain tickers and XXXUSD pairs pass via C-level string checks; the
+    # regex only decides the remaining cases, so the accepted set is unchanged.
+    fast_ok = sym.isascii() and (
+        (n <= 5 and sym.isalpha())
+        or (4 <= n <= 8 and sym.endswith("USD") and sym[:-3].isalpha())
+    )
+    if not (fast_ok or _SYMBOL_RE.match(sym)):
+         raise ValueError(f"Invalid symbol format: {symbol}")
+
+    # Optional: Check against a dynamic whitelist fetched from somewhere
+    # (cached by _allowed_symbols; changing ALLOWED_SYMBOLS needs a restart)
+    if sym not in _allowed_symbols():
+        raise ValueError(f"Symbol {symbol} not permitted in current configuration.")
+    logger.debug("Symbol %s validated.", symbol)
+
+def _format_error(context: str, message: str) -> Dict:
+    """Standardizes error reporting for tools."""
+    logger.error("Error - Context: %s, Message: %s", context, message) # Log error server-side
+    return {
+        "status": "error",
+        "context": context,
+        "message": message, # Keep message concise for client
+        # e.g. 2024-01-31T12:00:00.000Z (utcnow() is deprecated)
+        "timestamp": datetime.now(_UTC).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    }
+
+def _validate_strategy_parameters(strategy_parameters: Dict) -> Optional[Dict]:
+    """
+    Validates cloud_backtest's strategy parameters without touching the bridge.
+    Returns None if they are acceptable, otherwise the error dict to return.
+    """
+    # Example: ensure symbol exists in params
+    symbol = strategy_parameters.get('symbol')
+    if not symbol:
+        logger.warning("No symbol provided in strategy_parameters for validation.")
+        # Or potentially return an error if symbol is mandatory
+        return None
+    try:
+        _validate_symbol(symbol)
+    except ValueError as ve:
+        return _format_error("Validation Error", str(ve))
+    return None
 
 class TradingTools:
-    def __init__(self):
-        self.qc_bridge = QuantConnectCloudBridge()
+    def __init__(self, qc_bridge: Optional[QuantConnectCloudBridge] = None):
+        # The server passes in its bridge so tools share its concurrency limit
+        self.qc_bridge = qc_bridge or QuantConnectCloudBridge.instance()
         # Note: This env var might not be set in the container unless explicitly defined
         self.projects_dir = os.getenv("QC_PROJECTS_DIR", "./QuantConnect Projects") # Defaulting locally might be safer
 
@@ -49,13 +117,10 @@ class TradingTools:
         }
         """
         try:
-            # 1. Validate input (example: ensure symbol exists in params)
-            symbol = strategy_parameters.get('symbol')
-            if symbol:
-                 self._validate_symbol(symbol)
-            else:
-                 print("Warning: No symbol provided in strategy_parameters for validation.")
-                 # Or potentially raise ValueError if symbol is mandatory
+            # 1. Validate input
+            validation_error = _validate_strategy_parameters(strategy_parameters)
+            if validation_error:
+                return validation_error
 
             # --- Note: Strategy Parameter Handling --- 
             # The strategy_parameters dict is received but NOT automatically passed 
@@ -65,11 +130,11 @@ class TradingTools:
             # Passing arbitrary dicts requires modifying the QC algorithm 
             # (e.g., to read from ObjectStore) or enhancing the bridge/CLI interaction.
             # For now, these params are just validated/logged.
-            print(f"Received strategy parameters: {strategy_parameters}")
+            logger.debug("Received strategy parameters: %s", strategy_parameters)
 
             # 2. Push project to cloud (using the name directly)
-            # Quoting is handled within the bridge method
-            print(f"Pushing project: {project_name}")
+            # The bridge passes it as a single argv token, so no quoting is needed
+            logger.info("Pushing project: %s", project_name)
             push_result = await self.qc_bridge.push_changes(project_name)
             
             if not push_result["success"]:
@@ -77,11 +142,11 @@ class TradingTools:
                 error_details = push_result.get("error", "Unknown push error")
                 if push_result.get("output"): # Sometimes errors are in output
                     error_details += f" | Output: {push_result['output'][:200]}..."
-                return self._format_error("Push failed", error_details)
-            print(f"Push successful for project: {project_name}")
+                return _format_error("Push failed", error_details)
+            logger.info("Push successful for project: %s", project_name)
                 
             # 3. Submit backtest
-            print(f"Submitting backtest for project: {project_name}")
+            logger.info("Submitting backtest for project: %s", project_name)
             bt_result = await self.qc_bridge.submit_cloud_backtest(
                 project_name,
                 backtest_name # Pass optional name
@@ -90,10 +155,11 @@ class TradingTools:
             # Extract backtest ID if submission was successful
             backtest_id = None
             if bt_result["success"]:
-                 backtest_id = self._extract_backtest_id(bt_result["output"])
-                 print(f"Backtest submitted successfully. ID: {backtest_id}")
+                 # Parsed once by the bridge (None if the CLI didn't print one)
+                 backtest_id = bt_result.get("backtest_id")
+                 logger.info("Backtest submitted successfully. ID: %s", backtest_id)
             else:
-                 print(f"Backtest submission failed. Error: {bt_result.get('error')}")
+                 logger.error("Backtest submission failed. Error: %s", bt_result.get('error'))
 
             return {
                 "status": "success" if bt_result["success"] else "error",
@@ -103,12 +169,11 @@ class TradingTools:
             
         except ValueError as ve:
              # Catch specific validation errors
-             return self._format_error("Validation Error", str(ve))
+             return _format_error("Validation Error", str(ve))
         except Exception as e:
-            # Catch unexpected errors during the process
-            import traceback
-            print(f"Unexpected Error in cloud_backtest: {traceback.format_exc()}")
-            return self._format_error("Backtest process failed", str(e))
+            # Catch unexpected errors during the process (traceback is formatted by the log handler)
+            logger.exception("Unexpected Error in cloud_backtest")
+            return _format_error("Backtest process failed", str(e))
 
     # --------------------------
     # Live Trading Operations (Commented out until dependencies are implemented)
@@ -132,7 +197,7 @@ class TradingTools:
     #     Safety wrapper for live deployments
     #     """
     #     if not self._validate_confirmation_token(confirmation_token):
-    #         return self._format_error("Deployment blocked", "Invalid confirmation token")
+    #         return _format_error("Deployment blocked", "Invalid confirmation token")
             
     #     # This function needs to be implemented in qc_cloud.py
     #     return await deploy_live_with_confirmation(
@@ -176,10 +241,10 @@ class TradingTools:
         }
         """
         # Implementation would call QC data API or LEAN CLI data commands
-        print(f"Placeholder: Download data for {symbol}, {resolution} from {start_date} to {end_date}")
+        logger.info("Placeholder: Download data for %s, %s from %s to %s", symbol, resolution, start_date, end_date)
         # Example: Constructing a LEAN CLI command (requires verification)
-        # command = f"data download --ticker {shlex.quote(symbol)} --resolution {resolution} --start {start_date} --end {end_date}"
-        # result = await self.qc_bridge._execute_lean_command(command)
+        # argv = ["data", "download", "--ticker", symbol, "--resolution", resolution, "--start", start_date, "--end", end_date]
+        # result = await self.qc_bridge._execute_lean_command(argv)
         # return result
         return {
             "status": "success",
@@ -203,62 +268,44 @@ class TradingTools:
     )
     async def push_project(self, project_name: str) -> Dict:
         """Explicitly pushes project changes to the cloud."""
-        print(f"Explicitly pushing project: {project_name}")
-        # Quoting handled by bridge method
+        logger.info("Explicitly pushing project: %s", project_name)
         result = await self.qc_bridge.push_changes(project_name) 
-        print(f"Push result: {result}")
+        # The result includes the full CLI output
+        logger.debug("Push result: %s", result)
         return result
 
-    # --------------------------
-    # Utility Methods
-    # --------------------------
-
-    def _validate_symbol(self, symbol: str):
-        """Basic check for symbol format or whitelist (example)."""
-        # Example: Allow common stock/crypto formats
-        if not re.match(r'^[A-Z]{1,5}(USD)?$', symbol.upper()):
-             raise ValueError(f"Invalid symbol format: {symbol}")
-        
-        # Optional: Check against a dynamic whitelist fetched from somewhere
-        allowed = os.getenv("ALLOWED_SYMBOLS", "SPY,QQQ,AAPL,GOOG,BTCUSD,ETHUSD").split(',')
-        if symbol.upper() not in allowed:
-            raise ValueError(f"Symbol {symbol} not permitted in current configuration.")
-        print(f"Symbol {symbol} validated.")
-
-    def _format_error(self, context: str, message: str) -> Dict:
-        """Standardizes error reporting for tools."""
-        print(f"Error - Context: {context}, Message: {message}") # Log error server-side
-        return {
-            "status": "error",
-            "context": context,
-            "message": message, # Keep message concise for client
-            "timestamp": datetime.utcnow().isoformat() + "Z" # Add Z for UTC
-        }
-
-    def _extract_backtest_id(self, cli_output: str) -> Optional[str]:
-        """Parse backtest ID from LEAN CLI's 'cloud backtest' output."""
-        # Example output: "Started backtest named 'Adjective Noun Animal' for project 'My Project' with backtestId XXX"
-        # Or: "BacktestId: XXX"
-        match = re.search(r"(?:backtestId|BacktestId)[:\s]+(\S+)", cli_output)
-        if match:
-            return match.group(1).strip()
-        # Fallback or more specific regex needed if format varies
-        print(f"Could not extract backtest ID from output: {cli_output[:100]}...")
-        return None
-
 # --------------------------
 # Resource Definitions
 # --------------------------
 
+# How long a successful cloud project listing is served from memory
+PROJECTS_CACHE_TTL = 60.0
+_projects_cache: Optional[tuple] = None # (time.monotonic() of fetch, result)
+_projects_lock = asyncio.Lock()
+
+async def _cached_list_projects() -> Dict:
+    """
+    Lists cloud projects through the shared bridge, reusing a successful
+    result for PROJECTS_CACHE_TTL seconds so repeated resource reads within
+    that window don't run `lean cloud projects` again.
+    """
+    global _projects_cache
+    async with _projects_lock:
+        if _projects_cache and time.monotonic() - _projects_cache[0] < PROJECTS_CACHE_TTL:
+            return _projects_cache[1]
+        result = await QuantConnectCloudBridge.instance().list_projects()
+        if result.get("success"):
+            _projects_cache = (time.monotonic(), result)
+        return result
+
 class TradingResources:
-    # Note: Resource access methods should ideally be async if they perform I/O
-    # Making list_projects async in the bridge would be better.
-    # For now, assume it's synchronous or wrapped appropriately elsewhere.
+    # Note: Resource.get_data awaits coroutine access methods (like
+    # _cached_list_projects below) and runs plain ones on a worker thread.
     cloud_projects = Resource(
         name="cloud_projects",
         description="List of available QuantConnect Cloud projects (Placeholder Data)",
-        # This lambda calls the method on an instance
-        access_method=lambda: QuantConnectCloudBridge().list_projects()
+        # Shared bridge, with the listing cached for PROJECTS_CACHE_TTL seconds
+        access_method=_cached_list_projects
     )
 
     # Example: Reading from a file requires the file to exist in the container
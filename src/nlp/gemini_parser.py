@@ -1,68 +1,314 @@
 import google.generativeai as genai
+import asyncio
+import copy
+import functools
+import logging
 import os
+import re
+from collections import OrderedDict
 import json
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Configure the Gemini client
+# orjson is much faster than the stdlib json module; fall back if it's missing.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the
+# same exception either way.
 try:
+    import orjson
+
+    def _loads(text):
+        return orjson.loads(text)
+
+    def _dumps_pretty(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    def _loads(text):
+        return json.loads(text)
+
+    def _dumps_pretty(obj) -> str:
+        return json.dumps(obj, indent=2)
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=1)
+def _configure() -> bool:
+    """
+    Loads .env and configures the Gemini client on first use rather than at
+    import. Returns whether a usable GEMINI_API_KEY is set; the result is
+    cached, so later parses don't touch the environment.
+
+    Variables already in the environment win over .env, and setting
+    ALPHAFORGE_SKIP_DOTENV=1 skips reading .env entirely (for deployments that
+    inject the environment themselves).
+    """
+    if os.getenv("ALPHAFORGE_SKIP_DOTENV") != "1":
+        load_dotenv(override=False)
+
     api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables.")
-    genai.configure(api_key=api_key)
-except ValueError as e:
-    print(f"Error configuring Gemini: {e}")
-    # Handle the error appropriately - exit, raise, or use a default config
-    # For now, we'll print and potentially fail later when the model is used.
-except Exception as e:
-    print(f"An unexpected error occurred during Gemini configuration: {e}")
-
-def parse_gemini_response(user_input: str) -> dict:
-    """Uses Gemini to parse user input into a structured JSON config."""
     try:
-        # Check if API key is available
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key or api_key == "your_gemini_api_key":
-            print("Warning: GEMINI_API_KEY not properly configured in .env file")
-            return {
-                "error": "Gemini API key not configured",
-                "message": "Please set a valid GEMINI_API_KEY in your .env file",
-                "action": "backtest",
-                "symbols": ["SPY"],
-                "start_date": "2020-01-01",
-                "strategy_type": "mean_reversion"
-            }
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables.")
+        genai.configure(api_key=api_key)
+    except ValueError as e:
+        logger.error("Error configuring Gemini: %s", e)
+        # Parses return _default_fallback() until the key is fixed (and the process restarted)
+    except Exception as e:
+        logger.error("An unexpected error occurred during Gemini configuration: %s", e)
+    return bool(api_key and api_key != "your_gemini_api_key")
+
+def _default_fallback() -> dict:
+    """Result returned whenever the key is missing; a new dict each time, like every other result."""
+    return {
+        "error": "Gemini API key not configured",
+        "message": "Please set a valid GEMINI_API_KEY in your .env file",
+        "action": "backtest",
+        "symbols": ["SPY"],
+        "start_date": "2020-01-01",
+        "strategy_type": "mean_reversion"
+    }
+
+# Structured-output schema: Gemini returns JSON matching this, so the response
+# text can be passed straight to json.loads. The schema format has no free-form
+# objects, so strategy parameters come back as name/value pairs (see
+# _normalize_parameters).
+STRATEGY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string"},
+        "strategy_details": {"type": "string"},
+        "symbols": {"type": "array", "items": {"type": "string"}},
+        "start_date": {"type": "string"},
+        "end_date": {"type": "string", "nullable": True},
+        "strategy_type": {"type": "string"},
+        "parameters": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "value": {"type": "string"},
+                },
+                "required": ["name", "value"],
+            },
+        },
+    },
+    "required": ["action", "symbols", "start_date", "strategy_type"],
+}
 
-        model = genai.GenerativeModel('gemini-pro')
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": STRATEGY_SCHEMA,
+}
 
-        # Improved prompt with clearer instructions and example
-        prompt = f"""
-        [SYSTEM] You are a helpful assistant that converts natural language trading strategy requests into a structured JSON format suitable for the LEAN engine. Focus on extracting key parameters for backtesting.
+# The fixed part of the prompt; parse_gemini_response only appends the user
+# input. The user text appears once, after the example, to keep the request small.
+_PROMPT_PREFIX = """[SYSTEM] You are a helpful assistant that converts natural language trading strategy requests into a structured JSON format suitable for the LEAN engine. Focus on extracting key parameters for backtesting.
 
-        USER: {user_input}
+TEMPLATE: {"action":"backtest", "strategy_details": "<description>", "symbols": ["<symbol1>", "<symbol2>"], "start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD", "strategy_type": "<e.g., mean_reversion, trend_following, custom_indicator>", "parameters": [{ "name": "<param_name>", "value": "<param_value>" }] }
 
-        TEMPLATE: {{"action":"backtest", "strategy_details": "<description>", "symbols": ["<symbol1>", "<symbol2>"], "start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD", "strategy_type": "<e.g., mean_reversion, trend_following, custom_indicator>", "parameters": {{ "<param_name>": "<param_value>" }} }}
+Based *only* on the USER input, fill the TEMPLATE. If a value isn't mentioned, use a reasonable default or leave it empty if appropriate (e.g., end_date can often be omitted).
 
-        Based *only* on the USER input, fill the TEMPLATE. If a value isn't mentioned, use a reasonable default or leave it empty if appropriate (e.g., end_date can often be omitted).
+Example:
+USER: Backtest a simple moving average crossover on SPY from 2021-01-01 to 2023-12-31 using 50 and 200 day SMAs.
+JSON_OUTPUT: {"action":"backtest", "strategy_details": "simple moving average crossover using 50 and 200 day SMAs", "symbols": ["SPY"], "start_date": "2021-01-01", "end_date": "2023-12-31", "strategy_type": "moving_average_crossover", "parameters": [{ "name": "short_window", "value": "50" }, { "name": "long_window", "value": "200" }] }
 
-        Example:
-        USER: Backtest a simple moving average crossover on SPY from 2021-01-01 to 2023-12-31 using 50 and 200 day SMAs.
-        JSON_OUTPUT: {{"action":"backtest", "strategy_details": "simple moving average crossover using 50 and 200 day SMAs", "symbols": ["SPY"], "start_date": "2021-01-01", "end_date": "2023-12-31", "strategy_type": "moving_average_crossover", "parameters": {{ "short_window": 50, "long_window": 200 }} }}
+Now, process the actual user input:
+USER: """
+_PROMPT_SUFFIX = "\nJSON_OUTPUT:\n"
 
-        Now, process the actual user input:
-        USER: {user_input}
-        JSON_OUTPUT:
-        """
+# Built on first use by _get_model and reused for every parse
+_MODEL = None
 
-        print(f"Sending prompt to Gemini:\n{prompt}") # Log the prompt
+def _get_model():
+    """Returns the shared GenerativeModel, creating it on first call."""
+    global _MODEL
+    if _MODEL is None:
+        _MODEL = genai.GenerativeModel('gemini-1.5-flash', generation_config=GENERATION_CONFIG)
+    return _MODEL
+
+# Outermost {...} in a reply wrapped in ```json fences or prose; (?s) lets . span lines
+_JSON_EXTRACT_RE = re.compile(r"(?s)\{.*\}")
+
+def _decode_response(text: str):
+    """
+    Decodes a Gemini reply. Structured output mode returns bare JSON, which is
+    decoded directly; only if that fails is the outermost {...} pulled out in
+    one regex pass and decoded instead. Raises json.JSONDecodeError if neither works.
+    """
+    try:
+        return _loads(text)
+    except json.JSONDecodeError:
+        match = _JSON_EXTRACT_RE.search(text)
+        if match is None:
+            raise
+        return _loads(match.group(0))
 
+def _normalize_parameters(parameters) -> dict:
+    """
+    Turns the schema's [{"name": ..., "value": ...}] list back into a dict.
+    Values arrive as strings; numbers/booleans are converted ("50" -> 50).
+    A dict is returned unchanged.
+    """
+    if isinstance(parameters, dict):
+        return parameters
+    normalized = {}
+    for item in parameters or []:
+        value = item.get("value")
         try:
-            response = model.generate_content(prompt)
-            print(f"Raw Gemini Response Text:\n{response.text}") # Log the raw response
+            value = _loads(value)
+        except (TypeError, ValueError):
+            pass
+        normalized[item.get("name")] = value
+    return normalized
+
+# Default cap on concurrent Gemini requests in parse_many (API QPS limits)
+DEFAULT_PARSE_CONCURRENCY = 8
+
+# --- Regex fast path for simple, explicit queries ---
+_TICKER_RE = re.compile(r"\b[A-Z]{1,5}(?:USD)?\b")
+_DATE_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_WINDOW_RE = re.compile(r"\b(\d+)[- ]?(?:day|period|bar)s?\b", re.IGNORECASE)
+# "50 and 200 day", "50/200-day"
+_WINDOW_PAIR_RE = re.compile(r"\b(\d+)\s*(?:and|/|,)\s*(\d+)[- ]?(?:day|period|bar)s?\b", re.IGNORECASE)
+_RSI_THRESHOLD_RE = re.compile(r"\bRSI\s*[<>]=?\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+# Upper-case indicator/filler words that look like tickers but aren't; they
+# are dropped before the known-ticker check
+_TICKER_STOPLIST = frozenset({
+    "RSI", "SMA", "EMA", "MACD", "ATR", "ADX", "VWAP", "BB", "ETF",
+    "I", "A", "AND", "OR", "THE", "USD", "JSON", "LEAN",
+})
+@functools.lru_cache(maxsize=1)
+def _known_tickers() -> frozenset:
+    """
+    Tickers the fast path may answer for: the ALLOWED_SYMBOLS whitelist, with
+    the same default as src/mcp_server/tools._allowed_symbols (read here too so
+    the parser doesn't import the server package). Read once per process.
+    """
+    return frozenset(
+        s.strip().upper()
+        for s in os.getenv("ALLOWED_SYMBOLS", "SPY,QQQ,AAPL,GOOG,BTCUSD,ETHUSD").split(",")
+    )
+
+# Parameters the fast path must have found before it answers for a strategy
+_REQUIRED_PARAMETERS = {
+    "moving_average_crossover": ("short_window", "long_window"),
+    "moving_average": ("window",),
+    "rsi": ("rsi_threshold",),
+}
+# First match wins, so more specific phrases come first
+_STRATEGY_KEYWORDS = (
+    (re.compile(r"cross\s?over", re.IGNORECASE), "moving_average_crossover"),
+    (re.compile(r"mean[\s_-]?reversion", re.IGNORECASE), "mean_reversion"),
+    (re.compile(r"\bRSI\b", re.IGNORECASE), "rsi"),
+    (re.compile(r"\b(?:SMA|EMA|moving average)\b", re.IGNORECASE), "moving_average"),
+    (re.compile(r"trend[\s_-]?following", re.IGNORECASE), "trend_following"),
+    (re.compile(r"\bmomentum\b", re.IGNORECASE), "momentum"),
+)
+
+def _fast_parse(user_input: str) -> dict | None:
+    """
+    Parses simple queries like "Backtest SPY with RSI < 30 from 2022-05-01"
+    without calling Gemini. The result is final, so this only answers when it
+    is confident: symbols, an ISO start date and a known strategy keyword are
+    all present, every upper-case token is a known ticker (an unknown one such
+    as "MA" or "STD" may be jargon, not a symbol), and the strategy's required
+    parameters were found. Anything else returns None and goes to the model.
+    """
+    symbols = list(dict.fromkeys(
+        t for t in _TICKER_RE.findall(user_input) if t not in _TICKER_STOPLIST))
+    dates = _DATE_RE.findall(user_input)
+    strategy_type = next(
+        (name for pattern, name in _STRATEGY_KEYWORDS if pattern.search(user_input)), None)
+    if not (symbols and dates and strategy_type):
+        return None
+    if not _known_tickers().issuperset(symbols):
+        return None
+
+    parameters = {}
+    pair = _WINDOW_PAIR_RE.search(user_input)
+    windows = [int(w) for w in (pair.groups() if pair else _WINDOW_RE.findall(user_input))]
+    if len(windows) == 1:
+        parameters["window"] = windows[0]
+    elif len(windows) >= 2:
+        parameters["short_window"], parameters["long_window"] = min(windows), max(windows)
+    rsi = _RSI_THRESHOLD_RE.search(user_input)
+    if rsi:
+        parameters["rsi_threshold"] = _loads(rsi.group(1))
+    if not all(name in parameters for name in _REQUIRED_PARAMETERS.get(strategy_type, ())):
+        return None
+
+    return {
+        "action": "backtest",
+        "strategy_details": user_input.strip(),
+        "symbols": symbols,
+        "start_date": dates[0],
+        "end_date": dates[1] if len(dates) > 1 else None,
+        "strategy_type": strategy_type,
+        "parameters": parameters,
+    }
+
+# Parsed configs keyed by normalized input, most recently used last
+PARSE_CACHE_SIZE = 512
+_parse_cache: "OrderedDict[str, dict]" = OrderedDict()
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def _cache_key(user_input: str) -> str:
+    """Case- and whitespace-insensitive key, so trivially different repeats hit the cache."""
+    return _WHITESPACE_RE.sub(" ", user_input.strip().lower())
+
+async def parse_gemini_response(user_input: str) -> dict:
+    """
+    Uses Gemini to parse user input into a structured JSON config.
+    The API call is awaited, so the event loop keeps serving other requests.
+
+    Simple queries that name symbols, an ISO start date and a known strategy
+    are parsed locally by _fast_parse and never reach the API.
+
+    Successful results are kept in an LRU cache of PARSE_CACHE_SIZE entries,
+    so repeating a query skips the API call. Results containing "error" are
+    not cached. Callers get a copy and may modify it freely.
+    """
+    fast = _fast_parse(user_input)
+    if fast is not None:
+        return fast
+
+    key = _cache_key(user_input)
+    cached = _parse_cache.get(key)
+    if cached is not None:
+        _parse_cache.move_to_end(key)
+        return copy.deepcopy(cached)
+
+    result = await _parse_with_gemini(user_input)
+    if "error" not in result:
+        _parse_cache[key] = copy.deepcopy(result)
+        if len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return result
+
+async def _parse_with_gemini(user_input: str) -> dict:
+    """Does the actual Gemini round trip for parse_gemini_response."""
+    try:
+        # Check if API key is available
+        if not _configure():
+            logger.warning("GEMINI_API_KEY not properly configured in .env file")
+            return _default_fallback()
+
+        model = _get_model()
+
+        # Only the user text varies; the instructions and example are constant
+        prompt = "".join((_PROMPT_PREFIX, user_input, _PROMPT_SUFFIX))
+
+        # The prompt and raw response are large; only format them when DEBUG is on
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Sending prompt to Gemini:\n%s", prompt)
+
+        try:
+            response = await model.generate_content_async(prompt)
+            response_text = response.text # Raises here if the response has no text
+            if debug:
+                logger.debug("Raw Gemini Response Text:\n%s", response_text)
         except Exception as api_error:
-            print(f"Error calling Gemini API: {api_error}")
+            logger.error("Error calling Gemini API: %s", api_error)
             return {
                 "error": "Gemini API call failed",
                 "message": str(api_error),
@@ -72,45 +318,30 @@ def parse_gemini_response(user_input: str) -> dict:
                 "strategy_type": "mean_reversion"
             }
 
-        # Attempt to parse the response text as JSON
+        # Structured output mode returns bare JSON (no markdown fences); a
+        # fenced or prose-wrapped reply is still handled by _decode_response
         try:
-            # Extract JSON from response - handle various formats
-            cleaned_response_text = response.text.strip()
-
-            # Remove markdown code block markers if present
-            if cleaned_response_text.startswith("```") and cleaned_response_text.endswith("```"):
-                # Remove the first and last lines (```json and ```)
-                lines = cleaned_response_text.split('\n')
-                cleaned_response_text = '\n'.join(lines[1:-1])
-
-            # Remove any other backticks or language identifiers
-            cleaned_response_text = cleaned_response_text.strip("`json\n`").strip("`")
-
-            # Try to find JSON in the response if it's not properly formatted
-            if not cleaned_response_text.startswith("{"):
-                # Look for the start of JSON
-                json_start = cleaned_response_text.find("{")
-                json_end = cleaned_response_text.rfind("}")
-                if json_start >= 0 and json_end > json_start:
-                    cleaned_response_text = cleaned_response_text[json_start:json_end+1]
-
-            parsed_json = json.loads(cleaned_response_text)
-            print(f"Successfully parsed JSON: {parsed_json}")
+            parsed_json = _decode_response(response_text)
+            if debug:
+                logger.debug("Successfully parsed JSON: %s", parsed_json)
 
             # Basic validation (can be expanded)
             if not isinstance(parsed_json, dict):
                 raise ValueError("Parsed JSON is not a valid dictionary")
 
+            if "parameters" in parsed_json:
+                parsed_json["parameters"] = _normalize_parameters(parsed_json["parameters"])
+
             # Add action if missing
             if "action" not in parsed_json:
                 parsed_json["action"] = "backtest"
-                print("Added missing 'action' field with default value 'backtest'")
+                logger.debug("Added missing 'action' field with default value 'backtest'")
 
             # Ensure symbols is a list
             if "symbols" in parsed_json and not isinstance(parsed_json["symbols"], list):
                 if isinstance(parsed_json["symbols"], str):
                     parsed_json["symbols"] = [parsed_json["symbols"]]
-                    print(f"Converted 'symbols' from string to list: {parsed_json['symbols']}")
+                    logger.debug("Converted 'symbols' from string to list: %s", parsed_json['symbols'])
 
             # Add default values for missing required fields
             required_fields = {
@@ -122,27 +353,28 @@ def parse_gemini_response(user_input: str) -> dict:
             for field, default_value in required_fields.items():
                 if field not in parsed_json:
                     parsed_json[field] = default_value
-                    print(f"Added missing '{field}' field with default value: {default_value}")
+                    logger.debug("Added missing '%s' field with default value: %s", field, default_value)
 
             return parsed_json
 
         except json.JSONDecodeError as e:
-            print(f"Error decoding Gemini response JSON: {e}")
-            print(f"Problematic response text: {response.text}")
+            logger.error("Error decoding Gemini response JSON: %s", e)
+            if debug:
+                logger.debug("Problematic response text: %s", response_text)
             # Fallback mechanism: Return a default or error structure
             return {
                 "error": "Failed to parse Gemini response as JSON",
-                "raw_response": response.text,
+                "raw_response": response_text,
                 "action": "backtest",
                 "symbols": ["SPY"],
                 "start_date": "2020-01-01",
                 "strategy_type": "mean_reversion"
             }
         except Exception as e:
-            print(f"An unexpected error occurred during JSON parsing: {e}")
+            logger.exception("An unexpected error occurred during JSON parsing: %s", e)
             return {
                 "error": f"Unexpected JSON parsing error: {str(e)}",
-                "raw_response": response.text,
+                "raw_response": response_text,
                 "action": "backtest",
                 "symbols": ["SPY"],
                 "start_date": "2020-01-01",
@@ -151,28 +383,47 @@ def parse_gemini_response(user_input: str) -> dict:
 
     except AttributeError:
          # Handle cases where the response object doesn't have the expected structure
-        print(f"Error: Unexpected response structure from Gemini API.")
+        logger.error("Unexpected response structure from Gemini API.")
         try:
-            print(f"Full Gemini Response object: {response}")
+            logger.debug("Full Gemini Response object: %s", response)
         except NameError:
-             print("Gemini response object not available.")
+             logger.debug("Gemini response object not available.")
         return {"error": "Unexpected response structure from Gemini API."}
     except Exception as e:
-        print(f"An error occurred interacting with the Gemini API: {e}")
+        logger.exception("An error occurred interacting with the Gemini API: %s", e)
         # Check if 'response' exists before trying to access '.text'
         raw_response_text = "<Response object not available>"
         if 'response' in locals() and hasattr(response, 'text'):
             raw_response_text = response.text
         return {"error": f"Gemini API interaction failed: {str(e)}", "raw_response": raw_response_text}
 
+async def parse_many(inputs: list[str], max_concurrency: int = DEFAULT_PARSE_CONCURRENCY) -> list[dict]:
+    """
+    Parses several user inputs concurrently, with at most `max_concurrency`
+    Gemini requests in flight. Results are returned in the order of `inputs`.
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def parse_one(user_input: str) -> dict:
+        async with sem:
+            return await parse_gemini_response(user_input)
+
+    return await asyncio.gather(*(parse_one(x) for x in inputs))
+
 # Example usage (for testing):
 if __name__ == "__main__":
-    test_input = "Backtest SPY with RSI < 30 strategy starting from 2022-05-01"
-    print(f"Testing with input: {test_input}")
-    result = parse_gemini_response(test_input)
-    print(f"\nFinal Parsed Result:\n{json.dumps(result, indent=2)}")
-
-    test_input_complex = "I want to backtest a mean reversion strategy for AAPL and GOOG, using a 20-day lookback period, from the start of 2021 until today."
-    print(f"\nTesting with complex input: {test_input_complex}")
-    result_complex = parse_gemini_response(test_input_complex)
-    print(f"\nFinal Parsed Result (Complex):\n{json.dumps(result_complex, indent=2)}")
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        # One event loop for both calls: the async Gemini client is bound to the loop it first ran on
+        test_input = "Backtest SPY with RSI < 30 strategy starting from 2022-05-01"
+        print(f"Testing with input: {test_input}")
+        result = await parse_gemini_response(test_input)
+        print(f"\nFinal Parsed Result:\n{_dumps_pretty(result)}")
+
+        test_input_complex = "I want to backtest a mean reversion strategy for AAPL and GOOG, using a 20-day lookback period, from the start of 2021 until today."
+        print(f"\nTesting with complex input: {test_input_complex}")
+        result_complex = await parse_gemini_response(test_input_complex)
+        print(f"\nFinal Parsed Result (Complex):\n{_dumps_pretty(result_complex)}")
+
+    asyncio.run(main())
@@ -13,15 +13,26 @@ class BasicTemplateAlgorithm(QCAlgorithm):
         self.SetCash(100000)  # Set Strategy Cash
         
         # Add SPY as a default symbol
-        self.symbol = self.AddEquity("SPY", Resolution.Daily).Symbol
+        equity = self.AddEquity("SPY", Resolution.Daily)
+        self.symbol = equity.Symbol
+        
+        # Keep references to the security and its holding so OnData doesn't
+        # index Securities/Portfolio (a Python -> C# call) on every bar
+        self._security = equity
+        self._holding = self.Portfolio[self.symbol]
         
         # Define the moving average periods
         self.fast_period = 50
         self.slow_period = 200
         
-        # Create the moving average indicators
-        self.fast_ma = self.SMA(self.symbol, self.fast_period, Resolution.Daily)
-        self.slow_ma = self.SMA(self.symbol, self.slow_period, Resolution.Daily)
+        # Both moving averages come from one window of closes with running sums,
+        # so each bar is stored once and each sum is updated in O(1)
+        self._window = RollingWindow[float](self.slow_period)
+        self._fast_sum = 0.0
+        self._slow_sum = 0.0
+        
+        # Which side of the slow MA the fast MA was on at the last bar (None until known)
+        self._prev_above = None
         
         # Set the benchmark to SPY
         self.SetBenchmark("SPY")
@@ -37,36 +48,63 @@ class BasicTemplateAlgorithm(QCAlgorithm):
         
     def OnData(self, data):
         """Event handler for market data updates."""
-        # Skip if we're still in the warm-up period
-        if self.IsWarmingUp:
+        # Skip if we don't have data for our symbol
+        if not data.ContainsKey(self.symbol) or data[self.symbol] is None:
             return
         
-        # Skip if we don't have data for our symbol
-        if not data.ContainsKey(self.symbol):
+        # Update the rolling sums (also during warm-up, which is what fills them).
+        # Index 0 is the newest close, so the value leaving a window of length n
+        # is at index n - 1 before the new close is added.
+        price = float(data[self.symbol].Close)
+        window = self._window
+        if window.Count >= self.fast_period:
+            self._fast_sum -= window[self.fast_period - 1]
+        if window.IsReady:
+            self._slow_sum -= window[self.slow_period - 1]
+        window.Add(price)
+        self._fast_sum += price
+        self._slow_sum += price
+        
+        # Skip if we're still in the warm-up period or the window isn't full yet
+        if self.IsWarmingUp or not window.IsReady:
             return
         
-        # Skip if the moving averages aren't ready
-        if not self.fast_ma.IsReady or not self.slow_ma.IsReady:
+        # fast_sum / fast_period vs slow_sum / slow_period, without the divisions
+        fast_scaled = self._fast_sum * self.slow_period
+        slow_scaled = self._slow_sum * self.fast_period
+        
+        # Only a crossover can produce a trade, so the portfolio is only
+        # consulted when the fast MA changes side (a few times a year)
+        if fast_scaled == slow_scaled:
+            return
+        above = fast_scaled > slow_scaled
+        if above == self._prev_above:
             return
         
         # Get the current holdings
-        holdings = self.Portfolio[self.symbol].Quantity
+        holdings = self._holding.Quantity
         
         # Check for a buy signal: fast MA crosses above slow MA
-        if self.fast_ma.Current.Value > self.slow_ma.Current.Value and holdings <= 0:
-            # Calculate the quantity to buy
-            price = data[self.symbol].Close
-            quantity = self.CalculateOrderQuantity(self.symbol, 0.95)  # Use 95% of portfolio
+        if above and holdings <= 0:
+            # Calculate the quantity to buy: 95% of cash (the strategy is flat here)
+            security_price = self._security.Price
+            if security_price <= 0:
+                # The side isn't recorded, so the buy is retried on the next bar
+                return
+            quantity = int(self.Portfolio.Cash * 0.95 / security_price)
             
             # Place the buy order
             self.MarketOrder(self.symbol, quantity)
             self.Log(f"BUY {quantity} shares of {self.symbol} at {price}")
         
         # Check for a sell signal: fast MA crosses below slow MA
-        elif self.fast_ma.Current.Value < self.slow_ma.Current.Value and holdings > 0:
+        elif not above and holdings > 0:
             # Place the sell order
             self.Liquidate(self.symbol)
             self.Log(f"SELL {holdings} shares of {self.symbol}")
+
+        # Recorded only once the signal for this side has been handled
+        self._prev_above = above
     
     def OnOrderEvent(self, orderEvent):
         """Event handler for order status updates."""
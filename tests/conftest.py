@@ -0,0 +1,48 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+try:
+    import uvloop
+except ImportError:  # e.g. Windows, where uvloop isn't available
+    uvloop = None
+
+
+# Run async tests on uvloop when it's installed, like the server does.
+# optionalhook: older pytest-asyncio versions don't define this hook.
+@pytest.hookimpl(optionalhook=True)
+def pytest_asyncio_loop_factories(config, item):
+    if uvloop is None:
+        return None
+    return {"uvloop": uvloop.new_event_loop}
+
+
+# Built once and reused by every test that asks for async_mocks
+_ASYNC_MOCKS = (AsyncMock(), AsyncMock())
+
+
+@pytest.fixture
+def async_mocks():
+    """
+    Two AsyncMocks to install with patch.object(..., new=...), which skips
+    building fresh mocks per test. They are fully reset afterwards (calls,
+    return_value, side_effect); no test inspects state from another test, so
+    that is sufficient isolation.
+    """
+    yield _ASYNC_MOCKS
+    for mock in _ASYNC_MOCKS:
+        mock.reset_mock(return_value=True, side_effect=True)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _patch_gemini():
+    """
+    Replaces genai.GenerativeModel in the parser module once for the whole
+    session, so no test can reach the real Gemini client and tests don't each
+    pay for a patch()/unwind. Tests reset it and set their own responses on
+    its return_value (see mock_gemini in test_parser.py).
+    """
+    mp = pytest.MonkeyPatch()
+    fake_cls = MagicMock()
+    mp.setattr("src.nlp.gemini_parser.genai.GenerativeModel", fake_cls)
+    yield fake_cls
+    mp.undo()
@@ -0,0 +1,26 @@
+# Stand-in for the LEAN CLI's click group, run by LeanWorkerPool in tests
+# (see tests/test_lean_cli.py). Imported by the spawned worker processes.
+import os
+import click
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.argument("text")
+def echo(text):
+    click.echo(text)
+
+
+@cli.command()
+def pid():
+    click.echo(os.getpid())
+
+
+@cli.command()
+def fail():
+    click.echo("Something went wrong", err=True)
+    raise SystemExit(3)
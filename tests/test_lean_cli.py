@@ -0,0 +1,80 @@
+import logging
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from src.integrations import lean_cli
+
+@pytest.fixture
+def fresh_pool_state(monkeypatch):
+    """Forget any pool decision so get_worker_pool reads LEAN_WORKERS again."""
+    monkeypatch.setattr(lean_cli, "_worker_pool", None)
+    monkeypatch.setattr(lean_cli, "_worker_pool_disabled", False)
+
+@pytest.mark.parametrize("setting", ["", "0"])
+def test_worker_pool_off_by_default(fresh_pool_state, monkeypatch, setting):
+    monkeypatch.setenv("LEAN_WORKERS", setting)
+    assert lean_cli.get_worker_pool() is None
+
+@pytest.mark.parametrize("setting", ["many", "2.5", "-1"])
+def test_invalid_worker_setting_disables_pool(fresh_pool_state, monkeypatch, caplog, setting):
+    monkeypatch.setenv("LEAN_WORKERS", setting)
+    with caplog.at_level(logging.WARNING, logger=lean_cli.__name__):
+        assert lean_cli.get_worker_pool() is None
+        # Decided once: later calls neither raise nor warn again
+        assert lean_cli.get_worker_pool() is None
+
+    assert len(caplog.records) == 1
+    assert "LEAN_WORKERS" in caplog.records[0].getMessage()
+
+@pytest.fixture
+def stub_pool():
+    pool = lean_cli.LeanWorkerPool(max_workers=1, cli="tests.lean_stub:cli")
+    yield pool
+    pool.shutdown()
+
+async def test_worker_pool_runs_commands_in_warm_worker(stub_pool):
+    assert await stub_pool.run(["echo", "hello world"]) == (0, "hello world\n", "")
+    # One long-lived worker serves every command
+    _, first_pid, _ = await stub_pool.run(["pid"])
+    _, second_pid, _ = await stub_pool.run(["pid"])
+    assert first_pid == second_pid
+
+async def test_worker_pool_reports_failures(stub_pool):
+    return_code, stdout, stderr = await stub_pool.run(["fail"])
+    assert return_code == 3
+    assert "Something went wrong" in stderr
+
+def test_one_shot_commands_bypass_pool(stub_pool):
+    assert stub_pool.can_run(("cloud", "push", "P"))
+    assert not stub_pool.can_run(("login",))
+    assert not stub_pool.can_run(())
+
+def test_worker_pool_restarts_when_credentials_change(fresh_pool_state, monkeypatch, tmp_path):
+    credentials = tmp_path / "credentials"
+    monkeypatch.setattr(lean_cli, "_CREDENTIALS_PATH", str(credentials))
+    monkeypatch.setenv("LEAN_WORKERS", "2")
+    # Workers only start on the first command, so no real LEAN CLI is needed here
+    pool = lean_cli.get_worker_pool()
+    try:
+        assert lean_cli.get_worker_pool() is pool
+        credentials.write_text('{"user-id": "1", "api-token": "t"}')
+        restarted = lean_cli.get_worker_pool()
+        assert restarted is not pool
+        assert restarted.max_workers == 2
+        assert lean_cli.get_worker_pool() is restarted
+    finally:
+        pool.shutdown()
+        lean_cli._worker_pool.shutdown()
+
+def test_worker_cleans_temp_dirs_after_each_command(monkeypatch):
+    """Like `lean`'s own entry point, each pooled command deletes the CLI's temp dirs."""
+    from tests.lean_stub import cli
+    temp_manager = SimpleNamespace(delete_temporary_directories_when_done=True,
+                                   delete_temporary_directories=MagicMock())
+    monkeypatch.setattr(lean_cli, "_lean_cli", cli)
+    monkeypatch.setattr(lean_cli, "_temp_manager", temp_manager)
+
+    assert lean_cli._run_in_worker(["echo", "x"])[0] == 0
+    assert lean_cli._run_in_worker(["fail"])[0] == 3
+    assert temp_manager.delete_temporary_directories.call_count == 2
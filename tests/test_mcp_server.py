@@ -0,0 +1,95 @@
+import pytest
+from typing import Optional
+from fastapi.testclient import TestClient
+
+from mcp import McpServer, Tool
+from mcp.security import OAuth2Authenticator
+from mcp.server import _build_request_model
+
+# Plain-function tools take the server as their first argument (see McpServer.add_tools)
+@Tool(name="echo", description="Echo the params back", params={"text": "str", "count": "Optional[int]"})
+async def echo(_, text: str, count: Optional[int] = None):
+    return {"text": text, "count": count}
+
+@Tool(name="defaults_only", description="All params have defaults", params={"resolution": "str"})
+async def defaults_only(_, resolution: str = "daily"):
+    return {"resolution": resolution}
+
+@Tool(name="approved", description="Auth required, auto-approved", params={}, require_auth=True)
+async def approved(_):
+    return {"ok": True}
+
+@Tool(name="restricted", description="Auth required, not approved", params={}, require_auth=True)
+async def restricted(_):
+    return {"ok": True}
+
+@Tool(name="broken", description="Always raises", params={})
+async def broken(_):
+    raise RuntimeError("boom")
+
+class _RejectingAuthenticator(OAuth2Authenticator):
+    def authenticate(self, token: str) -> bool:
+        return token == "good"
+
+@pytest.fixture(scope="module")
+def client():
+    server = McpServer(name="Test Server")
+    server.add_tools([echo, defaults_only, approved, restricted, broken])
+    server.authenticator = _RejectingAuthenticator(auto_approve_tools=["approved"])
+    return TestClient(server.app)
+
+# --------------------------
+# Request models
+# --------------------------
+
+def test_request_model_required_and_defaulted_params():
+    fields = _build_request_model(echo).model_fields
+    assert fields["text"].is_required()
+    assert not fields["count"].is_required()
+    assert fields["count"].default is None
+
+def test_tool_called_with_validated_body(client):
+    response = client.post("/tools/echo", json={"text": "hi", "count": "3"})
+    assert response.status_code == 200
+    assert response.json() == {"text": "hi", "count": 3}
+
+def test_tool_defaults_fill_missing_params(client):
+    assert client.post("/tools/echo", json={"text": "hi"}).json() == {"text": "hi", "count": None}
+
+@pytest.mark.parametrize("body", [{}, {"count": 1}, {"text": "hi", "count": "many"}])
+def test_tool_rejects_invalid_body(client, body):
+    assert client.post("/tools/echo", json=body).status_code == 422
+
+def test_tool_without_body(client):
+    """A missing body is a 422 when a param is required, and means 'all defaults' otherwise."""
+    assert client.post("/tools/echo").status_code == 422
+    response = client.post("/tools/defaults_only")
+    assert response.status_code == 200
+    assert response.json() == {"resolution": "daily"}
+
+def test_tool_failure_is_500(client):
+    response = client.post("/tools/broken", json={})
+    assert response.status_code == 500
+    assert "boom" in response.json()["error"]
+
+# --------------------------
+# Auth
+# --------------------------
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Basic good"}, {"Authorization": "Bearer bad"}])
+def test_missing_or_invalid_token_is_401(client, headers):
+    assert client.post("/tools/approved", json={}, headers=headers).status_code == 401
+
+def test_unauthorized_tool_is_403(client):
+    response = client.post("/tools/restricted", json={}, headers={"Authorization": "Bearer good"})
+    assert response.status_code == 403
+
+def test_authorized_tool(client):
+    response = client.post("/tools/approved", json={}, headers={"Authorization": "Bearer good"})
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
+
+def test_no_auth_needed_without_authenticator():
+    server = McpServer(name="Open Server")
+    server.add_tools([restricted])
+    assert TestClient(server.app).post("/tools/restricted", json={}).status_code == 200
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from src.integrations import qc_cloud
+from src.integrations.qc_cloud import QuantConnectCloudBridge, _parse_submit_output
+
+@pytest.fixture
+def bridge(tmp_path, monkeypatch):
+    """A real bridge with its projects dir and push state file under tmp_path."""
+    monkeypatch.setattr(qc_cloud, "_PUSH_STATE_PATH", str(tmp_path / "state" / "push_state.json"))
+    projects = tmp_path / "projects"
+    projects.mkdir()
+    return QuantConnectCloudBridge(projects_dir=str(projects))
+
+# --------------------------
+# Shared instance
+# --------------------------
+
+def test_instance_is_shared_and_rejects_late_kwargs(monkeypatch):
+    monkeypatch.setattr(qc_cloud, "_INSTANCE", None)
+    sem = asyncio.Semaphore(2)
+    first = QuantConnectCloudBridge.instance(io_semaphore=sem)
+
+    assert QuantConnectCloudBridge.instance() is first
+    assert first._io_sem is sem
+    # A second server would otherwise silently keep the first one's semaphore
+    with pytest.raises(RuntimeError):
+        QuantConnectCloudBridge.instance(io_semaphore=asyncio.Semaphore(2))
+
+# --------------------------
+# Login check
+# --------------------------
+
+async def test_login_check_detects_logged_out_cli(bridge):
+    """`lean whoami` exits 0 when logged out, so its output decides."""
+    whoami = AsyncMock(return_value=(0, "You are not logged in\n", ""))
+    with patch.object(qc_cloud, "run_lean", new=whoami):
+        result = await bridge._execute_lean_command(("cloud", "status", "My Project"))
+
+    assert result["success"] is False
+    assert "not logged in" in result["error"]
+    # Only whoami ran; the command itself was never spawned
+    assert whoami.await_count == 1
+    assert whoami.await_args.args[0] == QuantConnectCloudBridge._WHOAMI
+
+async def test_login_check_runs_once(bridge):
+    run = AsyncMock(side_effect=[(0, "Logged in as Jane Doe\n", ""), (0, "a", ""), (0, "b", "")])
+    with patch.object(qc_cloud, "run_lean", new=run):
+        first = await bridge._execute_lean_command(("cloud", "status", "A"))
+        second = await bridge._execute_lean_command(("cloud", "status", "B"))
+
+    assert first["output"] == "a" and second["output"] == "b"
+    assert [c.args[0] for c in run.await_args_list] == [
+        QuantConnectCloudBridge._WHOAMI, ("cloud", "status", "A"), ("cloud", "status", "B"),
+    ]
+
+# --------------------------
+# Output parsing
+# --------------------------
+
+@pytest.mark.parametrize("output, expected", [
+    ("Backtest id: 8d5a3f\nBacktest name: Test", "8d5a3f"),
+    ("Started backtest named 'T' for project 'P' with backtestId BT-12345", "BT-12345"),
+    ("Project pushed", None),
+])
+def test_parse_submit_output(output, expected):
+    assert _parse_submit_output(output) == {"backtest_id": expected}
+
+async def test_submit_result_carries_backtest_id(bridge, monkeypatch):
+    monkeypatch.setattr(bridge, "_login_verified", True)
+    run = AsyncMock(return_value=(0, "Backtest id: 8d5a3f\n", ""))
+    with patch.object(qc_cloud, "run_lean", new=run):
+        result = await bridge.submit_cloud_backtest("P", "Run 1")
+
+    assert result["backtest_id"] == "8d5a3f"
+    assert run.await_args.args[0] == ("cloud", "backtest", "P", "--backtest-name", "Run 1")
+
+# --------------------------
+# Project creation
+# --------------------------
+
+async def test_create_project_lists_once_and_caches_created(bridge, async_mocks):
+    """A failed listing is not retried per create; created projects are remembered."""
+    mock_exec = async_mocks[0]
+    mock_exec.side_effect = [
+        {"success": False, "output": "", "error": "No such command 'projects'", "return_code": 2},
+        {"success": True, "output": "Created", "error": "", "return_code": 0},
+        {"success": True, "output": "Created", "error": "", "return_code": 0},
+    ]
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        first = await bridge.create_project("Alpha")
+        again = await bridge.create_project("Alpha")
+        other = await bridge.create_project("Beta")
+
+    assert first["success"] is True and "cached" not in first
+    assert again["cached"] is True
+    assert other["success"] is True
+    assert [c.args[0] for c in mock_exec.call_args_list] == [
+        QuantConnectCloudBridge._PROJECTS,
+        QuantConnectCloudBridge._CREATE + ("Alpha", "--language", "python"),
+        QuantConnectCloudBridge._CREATE + ("Beta", "--language", "python"),
+    ]
+
+# --------------------------
+# Push skipping
+# --------------------------
+
+_PUSHED = {"success": True, "output": "Pushed", "error": "", "return_code": 0}
+
+def _read_state():
+    with open(qc_cloud._PUSH_STATE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+async def test_push_skips_unchanged_project(bridge, async_mocks):
+    project = os.path.join(bridge._projects_dir, "My Project")
+    os.mkdir(project)
+    with open(os.path.join(project, "main.py"), "w") as f:
+        f.write("x = 1\n")
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = _PUSHED
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        first = await bridge.push_changes("My Project")
+        state = _read_state()
+        second = await bridge.push_changes("My Project")
+        # Size change -> new hash -> pushed again
+        with open(os.path.join(project, "main.py"), "a") as f:
+            f.write("y = 2\n")
+        third = await bridge.push_changes("My Project")
+
+    assert "skipped" not in first and "skipped" not in third
+    assert second["skipped"] is True
+    assert mock_exec.call_count == 2
+    assert set(state) == {"My Project"}
+    assert _read_state()["My Project"] != state["My Project"]
+
+async def test_push_state_is_loaded_from_disk(bridge, async_mocks):
+    """A new bridge (e.g. after a restart) skips projects pushed by an earlier one."""
+    os.mkdir(os.path.join(bridge._projects_dir, "P"))
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = _PUSHED
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        await bridge.push_changes("P")
+    restarted = QuantConnectCloudBridge(projects_dir=bridge._projects_dir)
+    with patch.object(restarted, "_execute_lean_command", new=mock_exec):
+        result = await restarted.push_changes("P")
+
+    assert result["skipped"] is True
+    assert mock_exec.call_count == 1
+
+async def test_failed_push_is_not_recorded(bridge, async_mocks):
+    os.mkdir(os.path.join(bridge._projects_dir, "P"))
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = {"success": False, "output": "", "error": "denied", "return_code": 1}
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        await bridge.push_changes("P")
+        await bridge.push_changes("P")
+
+    assert mock_exec.call_count == 2
+    assert not os.path.exists(qc_cloud._PUSH_STATE_PATH)
+
+async def test_push_with_broken_symlink(bridge, async_mocks):
+    project = os.path.join(bridge._projects_dir, "P")
+    os.mkdir(project)
+    os.symlink(os.path.join(project, "missing.py"), os.path.join(project, "link.py"))
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = _PUSHED
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        first = await bridge.push_changes("P")
+        second = await bridge.push_changes("P")
+
+    assert first["success"] is True
+    assert second["skipped"] is True
+
+async def test_concurrent_pushes_leave_valid_state(bridge, async_mocks):
+    """Saves go through a temp file and os.replace; no partial file or temp is left behind."""
+    names = [f"P{i}" for i in range(8)]
+    for name in names:
+        os.mkdir(os.path.join(bridge._projects_dir, name))
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = _PUSHED
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        await asyncio.gather(*(bridge.push_changes(name) for name in names))
+
+    assert set(_read_state()) == set(names)
+    assert os.listdir(os.path.dirname(qc_cloud._PUSH_STATE_PATH)) == ["push_state.json"]
+
+def test_failed_save_keeps_previous_state(bridge):
+    qc_cloud._save_push_state({"P": "old"})
+
+    def broken_dump(obj, f):
+        f.write('{"P": "ne')
+        raise OSError("disk full")
+
+    with patch.object(qc_cloud.json, "dump", new=broken_dump), pytest.raises(OSError):
+        qc_cloud._save_push_state({"P": "new"})
+
+    assert _read_state() == {"P": "old"}
+    assert os.listdir(os.path.dirname(qc_cloud._PUSH_STATE_PATH)) == ["push_state.json"]
+
+@pytest.mark.parametrize("name", ["../outside", "/", "/etc", "a/../../outside", ""])
+async def test_push_rejects_names_outside_projects_dir(bridge, async_mocks, name):
+    mock_exec = async_mocks[0]
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        result = await bridge.push_changes(name)
+
+    assert result["success"] is False
+    assert "Invalid project name" in result["error"]
+    mock_exec.assert_not_called()
+
+# --------------------------
+# Status cache
+# --------------------------
+
+_STATUS = {"success": True, "output": "Project: P", "error": "", "return_code": 0}
+
+async def test_status_cached_within_ttl(async_mocks):
+    bridge = QuantConnectCloudBridge(status_cache_ttl=60.0)
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = _STATUS
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        first = await bridge.get_project_status("P")
+        first["output"] = "changed by caller"
+        second = await bridge.get_project_status("P")
+
+    assert mock_exec.call_count == 1
+    # Each caller gets its own copy
+    assert second["output"] == "Project: P"
+
+async def test_status_refetched_after_ttl_and_expired_entries_dropped(async_mocks):
+    bridge = QuantConnectCloudBridge(status_cache_ttl=0.0)
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = _STATUS
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        await bridge.get_project_status("P")
+        await bridge.get_project_status("Q")
+        await bridge.get_project_status("P")
+
+    assert mock_exec.call_count == 3
+    assert set(bridge._status_cache) == {"P"}
+
+async def test_status_failure_not_cached(async_mocks):
+    bridge = QuantConnectCloudBridge(status_cache_ttl=60.0)
+    mock_exec = async_mocks[0]
+    mock_exec.return_value = {"success": False, "output": "", "error": "boom", "return_code": 1}
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        await bridge.get_project_status("P")
+        await bridge.get_project_status("P")
+
+    assert mock_exec.call_count == 2
+    assert bridge._status_cache == {}
+
+async def test_concurrent_status_polls_share_one_fetch(async_mocks):
+    bridge = QuantConnectCloudBridge(status_cache_ttl=60.0)
+
+    async def slow_status(argv):
+        await asyncio.sleep(0.01)
+        return _STATUS
+
+    mock_exec = async_mocks[0]
+    mock_exec.side_effect = slow_status
+    with patch.object(bridge, "_execute_lean_command", new=mock_exec):
+        results = await asyncio.gather(*(bridge.get_project_status("P") for _ in range(5)))
+
+    assert mock_exec.call_count == 1
+    assert all(r == _STATUS for r in results)
+    assert len({id(r) for r in results}) == 5
+    assert bridge._status_fetches == {}
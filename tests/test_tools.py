@@ -1,139 +1,141 @@
+import copy
 import pytest
-from unittest.mock import patch, MagicMock, AsyncMock # Import AsyncMock for async methods
+from unittest.mock import patch, create_autospec
 import os # Import os for environment variable mocking
 
-# Mock environment variables before other imports might need them
-@pytest.fixture(autouse=True)
-def mock_env_vars(monkeypatch):
-    monkeypatch.setenv("QC_PROJECTS_DIR", "./QuantConnect Projects")
-    # Add other potentially used env vars if necessary for tool initialization
-    # monkeypatch.setenv("ALLOWED_SYMBOLS", "SPY,QQQ")
+# Set environment variables once, before other imports might need them.
+# No test here changes them; a test that does should use monkeypatch.setenv.
+os.environ.setdefault("QC_PROJECTS_DIR", "./QuantConnect Projects")
+# Add other potentially used env vars if necessary for tool initialization
+# os.environ.setdefault("ALLOWED_SYMBOLS", "SPY,QQQ")
+# (the whitelist is cached, so after changing it call src.mcp_server.tools._allowed_symbols.cache_clear())
 
 # Import the class to test *after* setting up mocks if it uses env vars on import
-from src.mcp_server.tools import TradingTools
+from src.mcp_server.tools import TradingTools, _validate_strategy_parameters
+from src.integrations.qc_cloud import QuantConnectCloudBridge
 
-@pytest.fixture
+# Autospec'd bridge built once; its async methods are AsyncMocks with the real signatures
+_BRIDGE_TEMPLATE = create_autospec(QuantConnectCloudBridge, instance=True)
+
+@pytest.fixture(scope="module")
 def trading_tools():
-    """Provides an instance of TradingTools for testing."""
-    # Use patch to avoid actual bridge initialization during TradingTools instantiation
-    with patch('src.integrations.qc_cloud.QuantConnectCloudBridge') as mock_bridge_init:
-        # Configure the mock bridge instance if needed for __init__
-        mock_bridge_init.return_value = MagicMock()
-        tools = TradingTools()
-        # Assign the mock bridge instance to the tools instance for later use in tests
-        # tools.qc_bridge = mock_bridge_init.return_value
-        return tools
-
-@pytest.mark.asyncio
-async def test_cloud_backtest_success(trading_tools):
-    """Tests the cloud_backtest tool for a successful scenario."""
-    # Mock the QuantConnectCloudBridge methods used within cloud_backtest
-    with patch.object(trading_tools.qc_bridge, 'push_changes', new_callable=AsyncMock) as mock_push, \
-         patch.object(trading_tools.qc_bridge, 'submit_cloud_backtest', new_callable=AsyncMock) as mock_submit:
-
-        # Configure the return values of the mocked async methods
-        mock_push.return_value = {"success": True, "output": "Push successful"}
-        mock_submit.return_value = {
-            "success": True,
-            "output": "Started backtest named 'Test Backtest' for project 'Test Project' with backtestId BT-12345"
-            # Ensure output format matches what _extract_backtest_id expects
-        }
-
-        # Define test inputs
-        project_name = "Test Project"
-        strategy_parameters = {"symbol": "SPY", "window": 20} # Ensure symbol is valid per default ALLOWED_SYMBOLS
-        backtest_name = "Test Backtest Run"
-
-        # Call the tool method
-        result = await trading_tools.cloud_backtest(
-            project_name=project_name,
-            strategy_parameters=strategy_parameters,
-            backtest_name=backtest_name
-        )
-
-        # Assertions
-        assert result["status"] == "success"
-        assert result["backtest_id"] == "BT-12345"
-        assert "details" in result
-        assert result["details"]["success"] is True
-
-        # Verify mocks were called correctly
-        mock_push.assert_called_once_with(project_name)
-        mock_submit.assert_called_once_with(project_name, backtest_name)
-
-@pytest.mark.asyncio
-async def test_cloud_backtest_push_failure(trading_tools):
-    """Tests the cloud_backtest tool when the push_changes step fails."""
-    with patch.object(trading_tools.qc_bridge, 'push_changes', new_callable=AsyncMock) as mock_push, \
-         patch.object(trading_tools.qc_bridge, 'submit_cloud_backtest', new_callable=AsyncMock) as mock_submit:
-
-        mock_push.return_value = {"success": False, "error": "Push failed due to permissions"}
-
-        result = await trading_tools.cloud_backtest(
-            project_name="FailPush Project",
-            strategy_parameters={"symbol": "QQQ"},
-            backtest_name="PushFail Test"
-        )
-
-        assert result["status"] == "error"
-        assert result["context"] == "Push failed"
-        assert "Push failed due to permissions" in result["message"]
-        assert "backtest_id" not in result # Should not attempt submit
-
-        mock_push.assert_called_once_with("FailPush Project")
-        mock_submit.assert_not_called() # Verify submit wasn't called
-
-@pytest.mark.asyncio
-async def test_cloud_backtest_submit_failure(trading_tools):
-    """Tests the cloud_backtest tool when the submit_cloud_backtest step fails."""
-    with patch.object(trading_tools.qc_bridge, 'push_changes', new_callable=AsyncMock) as mock_push, \
-         patch.object(trading_tools.qc_bridge, 'submit_cloud_backtest', new_callable=AsyncMock) as mock_submit:
-
-        mock_push.return_value = {"success": True, "output": "Push successful"}
-        mock_submit.return_value = {"success": False, "error": "Cloud resource limit reached"}
-
-        result = await trading_tools.cloud_backtest(
-            project_name="SubmitFail Project",
-            strategy_parameters={"symbol": "AAPL"},
-            backtest_name="SubmitFail Test"
-        )
-
-        assert result["status"] == "error"
-        assert result["backtest_id"] is None # ID extraction should fail or return None
-        assert result["details"]["success"] is False
-        assert "Cloud resource limit reached" in result["details"]["error"]
-
-        mock_push.assert_called_once_with("SubmitFail Project")
-        mock_submit.assert_called_once_with("SubmitFail Project", "SubmitFail Test")
-
-@pytest.mark.asyncio
-async def test_cloud_backtest_invalid_symbol(trading_tools):
-    """Tests validation failure for disallowed symbols."""
-    with patch.object(trading_tools.qc_bridge, 'push_changes', new_callable=AsyncMock) as mock_push:
-         # No need to mock submit as it shouldn't be reached
-
-        result = await trading_tools.cloud_backtest(
-            project_name="InvalidSymbol Project",
-            strategy_parameters={"symbol": "INVALID"}, # Symbol not in default whitelist
-            backtest_name="InvalidSymbol Test"
-        )
-
-        assert result["status"] == "error"
-        assert result["context"] == "Validation Error"
-        assert "Symbol INVALID not permitted" in result["message"]
-
-        mock_push.assert_not_called() # Push should not happen if validation fails
+    """
+    Provides an instance of TradingTools for testing, backed by a copy of the
+    bridge template so no real bridge is created. Module-scoped: each test
+    patches the bridge methods it uses (see bridge_async_mocks), which restores them.
+    """
+    return TradingTools(qc_bridge=copy.copy(_BRIDGE_TEMPLATE))
+
+@pytest.fixture
+def bridge_async_mocks(trading_tools, async_mocks):
+    """
+    Installs the shared AsyncMocks as the bridge's push_changes and
+    submit_cloud_backtest for one test (a single patch.multiple context)
+    and yields them as (mock_push, mock_submit).
+    """
+    mock_push, mock_submit = async_mocks
+    with patch.multiple(trading_tools.qc_bridge, push_changes=mock_push, submit_cloud_backtest=mock_submit):
+        yield mock_push, mock_submit
+
+_PUSH_OK = {"success": True, "output": "Push successful"}
+_SUBMIT_OK = {
+    "success": True,
+    "output": "Started backtest named 'Test Backtest' for project 'Test Project' with backtestId BT-12345",
+    # Set by the bridge's _parse_submit_output on successful submissions
+    "backtest_id": "BT-12345",
+}
+
+def called_with(mock, *args):
+    """
+    True if `mock` was called exactly once, with exactly these positional args
+    and no kwargs. A plain tuple compare, cheaper than assert_called_once_with's
+    _Call equality; the tools always pass bridge arguments positionally.
+    """
+    return mock.call_count == 1 and mock.call_args.args == args and not mock.call_args.kwargs
+
+def _check_success(result, mock_push, mock_submit):
+    assert result["status"] == "success"
+    assert result["backtest_id"] == "BT-12345"
+    assert "details" in result
+    assert result["details"]["success"] is True
+    # Verify mocks were called correctly
+    assert called_with(mock_push, "Test Project")
+    assert called_with(mock_submit, "Test Project", "Test Backtest Run")
+
+def _check_push_fail(result, mock_push, mock_submit):
+    assert result["status"] == "error"
+    assert result["context"] == "Push failed"
+    assert "Push failed due to permissions" in result["message"]
+    assert "backtest_id" not in result # Should not attempt submit
+    assert called_with(mock_push, "FailPush Project")
+    mock_submit.assert_not_called() # Verify submit wasn't called
+
+def _check_submit_fail(result, mock_push, mock_submit):
+    assert result["status"] == "error"
+    assert result["backtest_id"] is None # ID extraction should fail or return None
+    assert result["details"]["success"] is False
+    assert "Cloud resource limit reached" in result["details"]["error"]
+    assert called_with(mock_push, "SubmitFail Project")
+    assert called_with(mock_submit, "SubmitFail Project", "SubmitFail Test")
+
+_CHECKS = {
+    "success": _check_success,
+    "push_fail": _check_push_fail,
+    "submit_fail": _check_submit_fail,
+}
+
+# (case, project_name, symbol, backtest_name, push result, submit result)
+CASES = [
+    ("success", "Test Project", "SPY", "Test Backtest Run", _PUSH_OK, _SUBMIT_OK),
+    ("push_fail", "FailPush Project", "QQQ", "PushFail Test",
+     {"success": False, "error": "Push failed due to permissions"}, None),
+    ("submit_fail", "SubmitFail Project", "AAPL", "SubmitFail Test",
+     _PUSH_OK, {"success": False, "error": "Cloud resource limit reached"}),
+]
+
+@pytest.mark.parametrize("case", CASES, ids=[c[0] for c in CASES])
+async def test_cloud_backtest(trading_tools, bridge_async_mocks, case):
+    """Tests the cloud_backtest tool: success and push/submit failures."""
+    name, project_name, symbol, backtest_name, push_result, submit_result = case
+    # The QuantConnectCloudBridge methods used within cloud_backtest are mocked by the fixture
+    mock_push, mock_submit = bridge_async_mocks
+    if push_result is not None:
+        mock_push.return_value = push_result
+    if submit_result is not None:
+        mock_submit.return_value = submit_result
+
+    result = await trading_tools.cloud_backtest(
+        project_name=project_name,
+        strategy_parameters={"symbol": symbol, "window": 20},
+        backtest_name=backtest_name
+    )
+
+    _CHECKS[name](result, mock_push, mock_submit)
+
+def test_symbol_validation():
+    """Symbol validation is a pure function, so no TradingTools or bridge mocks are needed."""
+    assert _validate_strategy_parameters({"symbol": "SPY", "window": 20}) is None
+    # Well-formed but not in the default whitelist; cloud_backtest returns this before any push/submit
+    result = _validate_strategy_parameters({"symbol": "MSFT", "window": 20})
+    assert result["status"] == "error"
+    assert result["context"] == "Validation Error"
+    assert "Symbol MSFT not permitted" in result["message"]
+
+@pytest.mark.parametrize("symbol", ["INVALID", "SP Y", "BRK.B", "12345"])
+def test_symbol_validation_rejects_bad_format(symbol):
+    result = _validate_strategy_parameters({"symbol": symbol})
+    assert result["context"] == "Validation Error"
+    assert f"Invalid symbol format: {symbol}" in result["message"]
 
 # Add more tests for other tools (push_project, download_data) and edge cases.
 # Example test for push_project:
-@pytest.mark.asyncio
-async def test_push_project(trading_tools):
-     with patch.object(trading_tools.qc_bridge, 'push_changes', new_callable=AsyncMock) as mock_push:
-        mock_push.return_value = {"success": True, "output": "Project pushed successfully."}
+async def test_push_project(trading_tools, bridge_async_mocks):
+     mock_push, _ = bridge_async_mocks
+     mock_push.return_value = {"success": True, "output": "Project pushed successfully."}
 
-        project_name = "MyPushTestProject"
-        result = await trading_tools.push_project(project_name)
+     project_name = "MyPushTestProject"
+     result = await trading_tools.push_project(project_name)
 
-        assert result["success"] is True
-        assert "Project pushed successfully" in result["output"]
-        mock_push.assert_called_once_with(project_name) 
\ No newline at end of file
+     assert result["success"] is True
+     assert "Project pushed successfully" in result["output"]
+     assert called_with(mock_push, project_name)